@@ -0,0 +1,180 @@
+# Usage: python -m benchmarks.bench_css_parser [--rules 20000]
+import argparse
+import random
+
+from benchmarks.utils import best_of
+from css.parser import CSSParser
+from css.selectors import DescendantSelector, SelectorRule, TagSelector
+
+TAGS = ["div", "p", "a", "span", "nav", "ul", "li", "section", "article", "h1"]
+PROPERTIES = {
+    "color": ["red", "blue", "#333", "lightgray"],
+    "font-size": ["90%", "110%", "12px", "1.5em"],
+    "font-family": ['"Courier New", monospace', "Helvetica, sans-serif"],
+    "border": ["1px solid black", "2px dashed #ccc"],
+    "margin": ["0 auto", "4px 8px 4px 8px"],
+}
+
+
+# The original parser, which visits every character through `curr_char`
+class CharLoopCSSParser:
+    def __init__(self, text: str):
+        self.text = text.strip()
+        self.i = 0
+
+    @property
+    def curr_char(self) -> str:
+        return self.text[self.i]
+
+    def more_to_parse(self) -> bool:
+        return self.i < len(self.text)
+
+    def consume_whitespace(self):
+        while self.more_to_parse() and self.curr_char.isspace():
+            self.i += 1
+
+    def consume_word(self) -> str:
+        start = self.i
+
+        while self.more_to_parse():
+            if self.curr_char.isalnum() or self.curr_char in '#-.%"':
+                self.i += 1
+            else:
+                break
+
+        if not (self.i > start):
+            raise Exception(f"Parsing error: {self.i} is not greater than {start}")
+
+        return self.text[start : self.i]
+
+    def consume_literal(self, literal: str):
+        if self.more_to_parse() and self.curr_char == literal:
+            self.i += 1
+        else:
+            raise Exception(f"Parsing error: {literal} not matched")
+
+    def parse_declaration(self) -> tuple[str, str]:
+        prop = self.consume_word()
+        self.consume_whitespace()
+        self.consume_literal(":")
+        self.consume_whitespace()
+
+        # CSS values may be multiple words, separated by whitespace
+        val = ""
+        while self.curr_char != ";":
+            val += self.consume_word()
+
+            if self.curr_char.isspace():
+                self.consume_whitespace()
+                val += " "
+
+        return prop.casefold(), val.strip()
+
+    def parse_declaration_block(self) -> dict[str, str]:
+        pairs: dict[str, str] = {}
+
+        while self.more_to_parse() and self.curr_char != "}":
+            try:
+                prop, val = self.parse_declaration()
+                pairs[prop.casefold()] = val
+                self.consume_whitespace()
+                self.consume_literal(";")
+                self.consume_whitespace()
+            except Exception:
+                why = self.ignore_until([";", "}"])
+                if why == ";":
+                    self.consume_literal(";")
+                    self.consume_whitespace()
+                else:
+                    break
+
+        return pairs
+
+    def ignore_until(self, chars: list[str]) -> str | None:
+        while self.more_to_parse():
+            if self.curr_char in chars:
+                return self.curr_char
+            else:
+                self.i += 1
+
+        return None
+
+    def parse_selector(self) -> TagSelector | DescendantSelector:
+        out = TagSelector(self.consume_word().casefold())
+        self.consume_whitespace()
+
+        while self.more_to_parse() and self.curr_char != "{":
+            tag = self.consume_word()
+            descendant = TagSelector(tag.casefold())
+            out = DescendantSelector(out, descendant)
+            self.consume_whitespace()
+
+        return out
+
+    def parse(self) -> list[SelectorRule]:
+        rules: list[SelectorRule] = []
+
+        while self.more_to_parse():
+            try:
+                self.consume_whitespace()
+                selector = self.parse_selector()
+                self.consume_literal("{")
+                self.consume_whitespace()
+                body = self.parse_declaration_block()
+                self.consume_literal("}")
+                rules.append((selector, body))
+            except Exception:
+                why = self.ignore_until(["}"])
+                if why == "}":
+                    self.consume_literal("}")
+                    self.consume_whitespace()
+                else:
+                    break
+
+        return rules
+
+
+def make_stylesheet(count: int, invalid_every: int = 50) -> str:
+    rng = random.Random(0)
+    parts = []
+    for i in range(count):
+        selector = " ".join(rng.choice(TAGS) for _ in range(rng.randint(1, 4)))
+        declarations = []
+        for prop in rng.sample(list(PROPERTIES), rng.randint(1, 4)):
+            declarations.append(f"{prop}: {rng.choice(PROPERTIES[prop])};")
+        # Sprinkle in some rules that have to be recovered from
+        if i % invalid_every == 0:
+            declarations.insert(1, rng.choice(["color: rgb(0, 0, 0);", "@bad;", "x y"]))
+        parts.append(f"{selector} {{\n  " + "\n  ".join(declarations) + "\n}\n")
+    return "".join(parts)
+
+
+def to_tuple(rules: list[SelectorRule]) -> list[tuple[list[str], dict[str, str]]]:
+    out = []
+    for selector, body in rules:
+        chain = (
+            selector.chain if isinstance(selector, DescendantSelector) else [selector]
+        )
+        out.append(([tag.tag for tag in chain if isinstance(tag, TagSelector)], body))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=20000)
+    args = parser.parse_args()
+
+    stylesheet = make_stylesheet(args.rules)
+    size_mb = len(stylesheet.encode("utf-8")) / (1024 * 1024)
+    print(f"stylesheet: {args.rules} rules, {size_mb:.2f} MB")
+
+    old_rules, old_s = best_of(lambda: CharLoopCSSParser(stylesheet).parse())
+    new_rules, new_s = best_of(lambda: CSSParser(stylesheet).parse())
+    assert to_tuple(old_rules) == to_tuple(new_rules), "Rules differ"
+    print(f"char loop: {size_mb / old_s:.2f} MB/s")
+    print(f"scanner: {size_mb / new_s:.2f} MB/s")
+    print(f"speedup: {old_s / new_s:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
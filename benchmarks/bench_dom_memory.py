@@ -0,0 +1,89 @@
+# Usage: python -m benchmarks.bench_dom_memory [--size-mb 4]
+import argparse
+import gc
+import tracemalloc
+from typing import Self
+from unittest import mock
+
+from benchmarks.bench_html_parser import make_document
+from web_html.node import Attributes
+from web_html.parser import HTMLParser
+
+
+# The original node classes, with a __dict__ and a style dict on every instance
+class DictElement:
+    def __init__(self, tag: str, attributes: Attributes, parent: Self | None):
+        self.tag = tag
+        self.attributes = attributes
+        self.children: list = []
+        self.parent = parent
+        self.style: dict[str, str] = {}
+
+
+class DictText:
+    def __init__(self, text: str, parent: DictElement):
+        self.text = text
+        self.children: list = []
+        self.parent = parent
+        self.style: dict[str, str] = {}
+
+
+class UninternedHTMLParser(HTMLParser):
+    def get_attributes(self, text) -> tuple[str, Attributes]:
+        parts = text.split()
+        tag = parts[0].casefold()
+        attributes = {}
+        for attrpair in parts[1:]:
+            if "=" in attrpair:
+                key, value = attrpair.split("=", 1)
+                if len(value) > 2 and value[0] in ["'", '"']:
+                    value = value[1:-1]
+                attributes[key.casefold()] = value
+            else:
+                attributes[attrpair.casefold()] = ""
+        return tag, attributes
+
+
+def count_nodes(root) -> int:
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+# Returns the number of nodes and the bytes allocated for the whole tree
+def measure(parser_class: type[HTMLParser], document: str) -> tuple[int, int]:
+    gc.collect()
+    tracemalloc.start()
+    root = parser_class(document).parse()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count_nodes(root), size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=4)
+    args = parser.parse_args()
+
+    document = make_document(int(args.size_mb * 1024 * 1024))
+
+    with mock.patch("web_html.parser.Element", DictElement), mock.patch(
+        "web_html.parser.Text", DictText
+    ):
+        old_nodes, old_bytes = measure(UninternedHTMLParser, document)
+    new_nodes, new_bytes = measure(HTMLParser, document)
+    assert old_nodes == new_nodes, "Node counts differ"
+
+    print(f"nodes: {new_nodes}")
+    print(f"dict nodes: {old_bytes / old_nodes:.1f} bytes/node")
+    print(f"slotted nodes: {new_bytes / new_nodes:.1f} bytes/node")
+    print(f"reduction: {1 - new_bytes / old_bytes:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Usage: python -m benchmarks.bench_draw [--paragraphs 200]
+import argparse
+from unittest import mock
+
+from benchmarks.utils import best_of
+from css.parser import get_default_stylesheet, style
+from css.rule_index import RuleIndex
+from layout.commands import DrawRect, DrawText
+from layout.font_backends import HeadlessFontBackend
+from layout.fonts import get_metrics, set_font_backend
+from layout.layout import (
+    LAYOUT_CACHE,
+    BlockLayout,
+    DisplayListItem,
+    DocumentLayout,
+    paint_tree,
+)
+from web_html.parser import HTMLParser
+
+PARAGRAPH = (
+    "<h1>Heading</h1><p>Lorem ipsum dolor sit amet, <b>consectetur adipiscing</b>"
+    " elit, sed do eiusmod tempor incididunt ut labore et dolore magna aliqua. Ut"
+    " enim ad minim veniam, quis <i>nostrud exercitation</i> ullamco laboris nisi"
+    " ut aliquip ex ea commodo consequat.</p><ul><li>Duis aute irure dolor</li></ul>"
+)
+
+
+# The original flush, which gives every word its own display list item
+def flush_per_word(self: BlockLayout):
+    if not self.line:
+        return
+
+    metrics = [get_metrics(item.font) for item in self.line]
+    max_ascent = max([metric.ascent for metric in metrics])
+    baseline = self.cursor_y + 1.25 * max_ascent
+
+    for item, metric in zip(self.line, metrics):
+        x = item.x
+        y = baseline - metric.ascent
+        if item.valign == "top":
+            y = baseline - max_ascent
+        if self.text_align == "right":
+            x += self.width - self.cursor_x
+        elif self.text_align == "center":
+            x += (self.width - self.cursor_x) / 2
+
+        self.display_list.append(
+            DisplayListItem(
+                x=x,
+                y=y,
+                word=item.word,
+                width=item.width,
+                source=item.source,
+                font=item.font,
+                color=item.color,
+                valign=item.valign,
+            )
+        )
+
+    max_descent = max([metric.descent for metric in metrics])
+    self.cursor_y = baseline + 1.25 * max_descent
+    self.cursor_x = 0
+    self.line = []
+
+
+# Stands in for tkinter.Canvas, since every create_text call is a round trip into Tk
+class CountingCanvas:
+    def __init__(self):
+        self.items = 0
+
+    def create_text(self, *args, **kwargs):
+        self.items += 1
+
+    def create_rectangle(self, *args, **kwargs):
+        self.items += 1
+
+
+def make_display_list(html: str) -> list[DrawText | DrawRect]:
+    root = HTMLParser(html).parse()
+    style(root, RuleIndex(list(get_default_stylesheet())))
+    LAYOUT_CACHE.clear()
+    document = DocumentLayout(root)
+    document.layout()
+    display_list: list[DrawText | DrawRect] = []
+    paint_tree(document, display_list)
+    return display_list
+
+
+def draw(display_list: list[DrawText | DrawRect]) -> int:
+    canvas = CountingCanvas()
+    for cmd in display_list:
+        cmd.execute(0, canvas)  # type: ignore
+    return canvas.items
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paragraphs", type=int, default=200)
+    args = parser.parse_args()
+
+    set_font_backend(HeadlessFontBackend())
+    html = PARAGRAPH * args.paragraphs
+
+    with mock.patch.object(BlockLayout, "flush", flush_per_word):
+        per_word = make_display_list(html)
+    runs = make_display_list(html)
+
+    old_items, old_s = best_of(lambda: draw(per_word))
+    new_items, new_s = best_of(lambda: draw(runs))
+    print(f"{'':>10} {'items':>8} {'draw':>9}")
+    print(f"{'per word':>10} {old_items:>8} {old_s * 1000:>7.2f}ms")
+    print(f"{'runs':>10} {new_items:>8} {new_s * 1000:>7.2f}ms")
+    print(f"{old_items / new_items:.1f}x fewer canvas items")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Usage: python -m benchmarks.bench_html_nesting [--depths 500 1000 2000 4000]
+import argparse
+
+from benchmarks.utils import best_of
+from constants import HEAD_TAGS
+from web_html.node import Node, Text
+from web_html.parser import HTMLParser
+
+
+class ListCompareHTMLParser(HTMLParser):
+    # The original check, which rebuilds the list of open tags for every token
+    def implicit_tags(self, tag: str | None):
+        while True:
+            open_tags = [node.tag for node in self.unfinished]
+            if open_tags == [] and tag != "html":
+                self.add_tag("html")
+            elif open_tags == ["html"] and tag not in ["head", "body", "/html"]:
+                if tag in HEAD_TAGS:
+                    self.add_tag("head")
+                else:
+                    self.add_tag("body")
+            elif open_tags == ["html", "head"] and tag not in ["/head"] + HEAD_TAGS:
+                self.add_tag("/head")
+            else:
+                break
+
+
+def make_document(depth: int) -> str:
+    opening = "".join(f"<div id={i}><span>{i}</span>" for i in range(depth))
+    return opening + "leaf" + "</div>" * depth
+
+
+# Iterative, since these trees are far deeper than the recursion limit
+def same_tree(a: Node, b: Node) -> bool:
+    stack = [(a, b)]
+    while stack:
+        x, y = stack.pop()
+        if isinstance(x, Text) or isinstance(y, Text):
+            if not (isinstance(x, Text) and isinstance(y, Text) and x.text == y.text):
+                return False
+        elif x.tag != y.tag or x.attributes != y.attributes:
+            return False
+        if len(x.children) != len(y.children):
+            return False
+        stack.extend(zip(x.children, y.children))
+    return True
+
+
+def parse(parser_class: type[HTMLParser], document: str):
+    parser_class(document).parse()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--depths", type=int, nargs="+", default=[500, 1000, 2000, 4000]
+    )
+    args = parser.parse_args()
+
+    print(f"{'depth':>8} {'list compare':>14} {'insertion mode':>16} {'speedup':>8}")
+    for depth in args.depths:
+        document = make_document(depth)
+        assert same_tree(
+            ListCompareHTMLParser(document).parse(), HTMLParser(document).parse()
+        ), "Trees differ"
+
+        _, old_s = best_of(lambda: parse(ListCompareHTMLParser, document))
+        _, new_s = best_of(lambda: parse(HTMLParser, document))
+        print(f"{depth:>8} {old_s:>13.3f}s {new_s:>15.3f}s {old_s / new_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Usage: python -m benchmarks.bench_html_parser [--size-mb 4]
+import argparse
+import random
+
+from benchmarks.utils import best_of
+from tests.test_html_parser import to_tuple
+from web_html.parser import HTMLParser
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing"]
+
+
+class CharLoopHTMLParser(HTMLParser):
+    # The original tokenizer, which visits every character in Python
+    def feed(self, chunk: str):
+        text = "".join(self.pending)
+        self.pending = []
+
+        for c in chunk:
+            if c == "<":
+                self.in_tag = True
+                if text:
+                    self.add_text(text)
+                text = ""
+            elif c == ">":
+                self.in_tag = False
+                self.add_tag(text)
+                text = ""
+            else:
+                text += c
+
+        if text:
+            self.pending.append(text)
+
+
+# Skips building the tree, to time the tokenizer on its own
+class TokenCounter:
+    def __init__(self):
+        self.count = 0
+
+    def add_tag(self, tag: str):
+        self.count += 1
+
+    def add_text(self, text: str):
+        self.count += 1
+
+
+def tokenize(parser_class: type[HTMLParser], document: str) -> int:
+    parser = parser_class()
+    counter = TokenCounter()
+    parser.add_tag = counter.add_tag
+    parser.add_text = counter.add_text
+    parser.feed(document)
+    return counter.count
+
+
+def parse(parser_class: type[HTMLParser], document: str):
+    parser_class(document).parse()
+
+
+def make_document(size: int, words_per_paragraph: int = 60) -> str:
+    rng = random.Random(0)
+    parts = ["<!doctype html><html><head><title>Benchmark</title></head><body>"]
+    length = 0
+    while length < size:
+        count = rng.randint(5, words_per_paragraph)
+        words = " ".join(rng.choice(WORDS) for _ in range(count))
+        section = (
+            f"<div class='section'><h2>{rng.choice(WORDS)}</h2>"
+            f"<p>{words} <b>{rng.choice(WORDS)}</b> <a href='/{length}'>link</a></p>"
+            f"<ul><li>{rng.choice(WORDS)}</li><li>{rng.choice(WORDS)}</li></ul></div>\n"
+        )
+        parts.append(section)
+        length += len(section)
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=4)
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    documents = {
+        "markup-heavy": make_document(size),
+        "text-heavy": make_document(size, words_per_paragraph=1000),
+    }
+
+    for name, document in documents.items():
+        size_mb = len(document.encode("utf-8")) / (1024 * 1024)
+        print(f"{name} document: {size_mb:.2f} MB")
+
+        old_count, old_s = best_of(lambda: tokenize(CharLoopHTMLParser, document))
+        new_count, new_s = best_of(lambda: tokenize(HTMLParser, document))
+        assert old_count == new_count, "Token counts differ"
+        print(f"  tokenize, char loop: {size_mb / old_s:.2f} MB/s")
+        print(f"  tokenize, delimiter scan: {size_mb / new_s:.2f} MB/s")
+        print(f"  tokenize speedup: {old_s / new_s:.2f}x")
+
+        old_tree = CharLoopHTMLParser(document).parse()
+        new_tree = HTMLParser(document).parse()
+        assert to_tuple(old_tree) == to_tuple(new_tree), "Trees differ"
+        # Don't keep trees alive while timing, or the collector has more to scan
+        del old_tree, new_tree
+
+        _, old_s = best_of(lambda: parse(CharLoopHTMLParser, document))
+        _, new_s = best_of(lambda: parse(HTMLParser, document))
+        print(f"  parse, char loop: {size_mb / old_s:.2f} MB/s")
+        print(f"  parse, delimiter scan: {size_mb / new_s:.2f} MB/s")
+        print(f"  parse speedup: {old_s / new_s:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
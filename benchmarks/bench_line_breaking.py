@@ -0,0 +1,83 @@
+# Usage: python -m benchmarks.bench_line_breaking [--words 100000] [--width 800]
+import argparse
+import random
+from typing import Sequence
+
+from benchmarks.utils import best_of
+from css.parser import get_default_stylesheet, style
+from css.rule_index import RuleIndex
+from layout.font_backends import HeadlessFontBackend
+from layout.fonts import get_font_from_node, set_font_backend, space_width
+from layout.layout import LAYOUT_CACHE, BlockLayout, DocumentLayout
+from web_html.node import Element, Text
+from web_html.parser import HTMLParser
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "a", "consectetur", "elit"]
+HYPHENATED = ["hy&shy;phen&shy;ated", "co&shy;op&shy;er&shy;ate"]
+
+
+# The original line breaking, which handles one word at a time
+class WordAtATimeBlockLayout(BlockLayout):
+    def word_run(
+        self, node: Text, words: Sequence[str], gaps: Sequence[int] | None = None
+    ):
+        space = space_width(get_font_from_node(node))
+        for i, word in enumerate(words):
+            if gaps:
+                self.cursor_x += gaps[i] * space
+            self.word(node, word)
+
+
+def make_text(count: int) -> str:
+    rng = random.Random(0)
+    words = [rng.choice(WORDS) for _ in range(count)]
+    for i in range(0, count, 50):
+        words[i] = rng.choice(HYPHENATED)
+    return " ".join(words)
+
+
+def find_block(html: str) -> Element:
+    root = HTMLParser(html).parse()
+    style(root, RuleIndex(list(get_default_stylesheet())))
+    body = root.children[0]
+    assert isinstance(body, Element)
+    block = body.children[0]
+    assert isinstance(block, Element)
+    return block
+
+
+def lay_out(cls: type[BlockLayout], node: Element, width: int):
+    # The cache would skip line breaking entirely after the first run
+    LAYOUT_CACHE.clear()
+    block = cls(node, DocumentLayout(node, width=width), None)
+    block.layout()
+    return block.display_list
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--words", type=int, default=100_000)
+    parser.add_argument("--width", type=int, default=800)
+    args = parser.parse_args()
+
+    # Measure without Tk so the numbers are about line breaking, not the display
+    set_font_backend(HeadlessFontBackend())
+    text = make_text(args.words)
+
+    print(f"{'element':>8} {'words':>8} {'per word':>10} {'batched':>9} {'speedup':>8}")
+    for tag in ["p", "pre"]:
+        node = find_block(f"<{tag}>{text}</{tag}>")
+        # Warm the measurement cache, which both versions share
+        lay_out(BlockLayout, node, args.width)
+
+        old, old_s = best_of(lambda: lay_out(WordAtATimeBlockLayout, node, args.width))
+        new, new_s = best_of(lambda: lay_out(BlockLayout, node, args.width))
+        assert old == new, "Lines differ"
+        print(
+            f"{tag:>8} {args.words:>8} {old_s:>9.3f}s {new_s:>8.3f}s"
+            f" {old_s / new_s:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Usage: python -m benchmarks.bench_resize [--paragraphs 500] [--steps 40]
+import argparse
+from unittest import mock
+
+from benchmarks.utils import best_of
+from css.parser import get_default_stylesheet, style
+from css.rule_index import RuleIndex
+from layout.font_backends import HeadlessFontBackend
+from layout.fonts import set_font_backend
+from layout.layout import LAYOUT_CACHE, DocumentLayout, paint_tree
+from web_html.node import Element, PreLine, Text, split_pre_line
+from web_html.parser import HTMLParser
+
+PARAGRAPH = (
+    "<p>Lorem ipsum dolor sit amet, <b>consectetur</b> adipiscing elit, sed do"
+    " eiusmod tempor incididunt ut labore et dolore magna aliqua.</p>"
+    "<pre>for line in lines:\n    print(line,  end='')\n</pre>"
+)
+
+
+# The original layout, which splits every text node again on each pass
+def split_words(text: Text) -> tuple[str, ...]:
+    return tuple(text.text.split())
+
+
+def split_pre_lines(text: Text) -> tuple[PreLine | None, ...]:
+    return tuple(
+        split_pre_line(line) if line else None for line in text.text.split("\n")
+    )
+
+
+def make_document(paragraphs: int) -> Element:
+    root = HTMLParser(PARAGRAPH * paragraphs).parse()
+    style(root, RuleIndex(list(get_default_stylesheet())))
+    return root
+
+
+# Drags the window narrower one step at a time, laying out again at every width.
+# Splitting text is a small part of each pass next to line breaking and painting,
+# so both versions run within noise of each other (0.88x-1.07x on repeat runs).
+def drag(root: Element, widths: list[int]):
+    document = DocumentLayout(root, width=widths[0])
+    for width in widths:
+        document.width = width
+        document.layout()
+
+    display_list = []
+    paint_tree(document, display_list)
+    return display_list
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paragraphs", type=int, default=500)
+    parser.add_argument("--steps", type=int, default=40)
+    args = parser.parse_args()
+
+    set_font_backend(HeadlessFontBackend())
+    root = make_document(args.paragraphs)
+    widths = [800 - 10 * step for step in range(args.steps)]
+
+    def run():
+        # Every width is new, but clear the cache anyway so each run does the same work
+        LAYOUT_CACHE.clear()
+        return drag(root, widths)
+
+    with mock.patch.object(Text, "words", split_words), mock.patch.object(
+        Text, "pre_lines", split_pre_lines
+    ):
+        old, old_s = best_of(run)
+    new, new_s = best_of(run)
+    assert old == new, "Layouts differ"
+
+    print(f"{args.paragraphs} paragraphs, {args.steps} widths")
+    print(f"splitting every pass: {old_s:.3f}s")
+    print(f"split once: {new_s:.3f}s")
+    print(f"speedup: {old_s / new_s:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
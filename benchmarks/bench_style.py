@@ -0,0 +1,97 @@
+# Usage: python -m benchmarks.bench_style [--depth 400] [--breadth 20]
+import argparse
+
+from benchmarks.utils import best_of
+from css.parser import CSSParser, style
+from css.rule_index import RuleIndex
+from css.selectors import (
+    AbstractSelector,
+    AncestorFilter,
+    CSSRule,
+    DescendantSelector,
+    cascade_priority,
+)
+from utils import tree_to_list
+from web_html.node import Element, Node
+from web_html.parser import HTMLParser
+
+STYLESHEET = """
+article section p span { color: red; }
+nav ul li a { color: blue; }
+aside div div span { font-style: italic; }
+footer div p span b { font-weight: bold; }
+main article div p { font-size: 90%; }
+header nav a { color: green; }
+table tr td span { color: gray; }
+form fieldset div span { color: purple; }
+div div div div span { font-style: normal; }
+"""
+
+
+# The original matching, which walks to the root for every level of the selector
+def recursive_matches(selector: AbstractSelector, node: Node) -> bool:
+    if not isinstance(selector, DescendantSelector):
+        return selector.matches(node)
+    if not recursive_matches(selector.descendant, node):
+        return False
+    while node.parent:
+        if recursive_matches(selector.ancestor, node.parent):
+            return True
+        node = node.parent
+    return False
+
+
+class RecursiveRuleIndex(RuleIndex):
+    def matching_rules(
+        self, node: Node, ancestors: AncestorFilter | None = None
+    ) -> list[CSSRule]:
+        if not isinstance(node, Element):
+            return []
+        candidates = self.buckets.get(node.tag, [])
+        return [
+            body
+            for _, selector, body in candidates
+            if recursive_matches(selector, node)
+        ]
+
+
+def make_document(depth: int, breadth: int) -> str:
+    # A deep spine of nested divs, with a paragraph hanging off every level
+    level = "<div><p>text <span>more <b>bold</b></span></p>"
+    leaves = "".join(f"<p><span>{i}</span></p>" for i in range(breadth))
+    return level * depth + leaves + "</div>" * depth
+
+
+def computed_styles(root: Element) -> list[dict[str, str]]:
+    return [dict(node.style) for node in tree_to_list(root, [])]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--depths", type=int, nargs="+", default=[20, 40, 80])
+    parser.add_argument("--breadth", type=int, default=20)
+    args = parser.parse_args()
+
+    rules = sorted(CSSParser(STYLESHEET).parse(), key=cascade_priority)
+
+    print(
+        f"{'depth':>8} {'nodes':>8} {'recursive':>11} {'filtered':>10} {'speedup':>8}"
+    )
+    for depth in args.depths:
+        root = HTMLParser(make_document(depth, args.breadth)).parse()
+
+        style(root, RecursiveRuleIndex(rules))
+        expected = computed_styles(root)
+        style(root, RuleIndex(rules))
+        assert computed_styles(root) == expected, "Styles differ"
+
+        _, old_s = best_of(lambda: style(root, RecursiveRuleIndex(rules)))
+        _, new_s = best_of(lambda: style(root, RuleIndex(rules)))
+        print(
+            f"{depth:>8} {len(expected):>8} {old_s:>10.3f}s {new_s:>9.3f}s"
+            f" {old_s / new_s:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import time
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+# Returns the result of the last run along with the fastest time, in seconds
+def best_of(fn: Callable[[], T], repeat: int = 3) -> tuple[T, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
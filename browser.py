@@ -1,23 +1,38 @@
 #!/usr/bin/env python3
 import tkinter
 
-from constants import HEIGHT, SCROLL_STEP, VSTEP, WIDTH
-from css.parser import CSSParser, get_default_stylesheet, style
-from css.selectors import cascade_priority
+from constants import (
+    HEIGHT,
+    MAX_PARALLEL_REQUESTS,
+    RESIZE_THROTTLE_MS,
+    SCROLL_STEP,
+    VSTEP,
+    WIDTH,
+)
+from css.computed import StyleCache
+from css.parser import get_default_stylesheet, parse_stylesheet, restyle, style
+from css.rule_index import RuleIndex
+from css.selectors import merge_rules
 from web_html.parser import HTMLParser
 from web_html.node import Element
 from layout.commands import DrawRect, DrawText
-from layout.layout import DocumentLayout, paint_tree
-from url import URL, AbstractURL
+from layout.layout import LAYOUT_CACHE, DocumentLayout, paint_tree
+from url import URL, AbstractURL, request_all
 from utils import tree_to_list
 
 
 class Browser:
-    def __init__(self, rtl: bool = False):
+    def __init__(
+        self, rtl: bool = False, max_parallel_requests: int = MAX_PARALLEL_REQUESTS
+    ):
         self.rtl = rtl
+        self.max_parallel_requests = max_parallel_requests
         self.scroll = 0
         self.screen_height = HEIGHT
         self.screen_width = WIDTH
+        # Latest size from a <Configure> event that hasn't been laid out yet
+        self.pending_size: tuple[int, int] | None = None
+        self.resize_job: str | None = None
 
         self.window = tkinter.Tk()
         self.canvas = tkinter.Canvas(
@@ -41,21 +56,34 @@ class Browser:
         ]
 
     def load(self, url: AbstractURL):
-        body, _ = url.request()
-        self.nodes = HTMLParser(body).parse()
-        rules = get_default_stylesheet().copy()
+        parser = HTMLParser()
+        for chunk in url.stream():
+            parser.feed(chunk)
+        self.nodes = parser.close()
         links = self.get_stylesheets()
 
-        for link in links:
-            style_url = url.resolve(link)
-            try:
-                body, _ = style_url.request()
-            except:
+        # Fetch stylesheets concurrently, but merge them in document order
+        style_urls = [url.resolve(link) for link in links]
+        author_rules = []
+        for body in request_all(style_urls, self.max_parallel_requests):
+            if body is None:
                 continue
-            rules.extend(CSSParser(body).parse())
+            author_rules.extend(parse_stylesheet(body))
 
-        style(self.nodes, sorted(rules, key=cascade_priority))
+        rules = merge_rules(get_default_stylesheet(), author_rules)
+        self.rules = RuleIndex(rules)
+        # Shared styles are only valid for the rules they were computed with
+        self.style_cache = StyleCache()
+        style(self.nodes, self.rules, cache=self.style_cache)
 
+        # Cached lines belong to the previous page's nodes, which are gone now
+        LAYOUT_CACHE.clear()
+        self.layout()
+        self.draw()
+
+    # Call after mutating the DOM through the node methods that mark nodes dirty
+    def restyle(self):
+        restyle(self.nodes, self.rules, self.style_cache)
         self.layout()
         self.draw()
 
@@ -63,6 +91,12 @@ class Browser:
         self.document = DocumentLayout(
             self.nodes, width=self.screen_width, rtl=self.rtl
         )
+        self.relayout()
+
+    # Lays out the existing layout tree again at the current width. Only blocks whose
+    # width changed break their lines again, the rest just move.
+    def relayout(self):
+        self.document.width = self.screen_width
         self.document.layout()
         self.display_list: list[DrawRect | DrawText] = []
         paint_tree(self.document, self.display_list)
@@ -119,10 +153,25 @@ class Browser:
             self.draw()
 
     # Ex. 2-3
+    # Tk sends a stream of <Configure> events while the window is dragged, so only the
+    # latest size is applied, at most once every RESIZE_THROTTLE_MS
     def resize(self, e):
-        self.screen_height = e.height
-        self.screen_width = e.width
-        self.layout()
+        self.pending_size = (e.width, e.height)
+        if self.resize_job is None:
+            self.resize_job = self.window.after(RESIZE_THROTTLE_MS, self.apply_resize)
+
+    def apply_resize(self):
+        self.resize_job = None
+        if self.pending_size is None:
+            return
+        width, height = self.pending_size
+        self.pending_size = None
+
+        self.screen_height = height
+        # Changing only the height doesn't move anything on the page
+        if width != self.screen_width:
+            self.screen_width = width
+            self.relayout()
         self.draw()
 
 
@@ -132,8 +181,11 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("url")
     parser.add_argument("--rtl", action="store_true")
+    parser.add_argument(
+        "--max-parallel-requests", type=int, default=MAX_PARALLEL_REQUESTS
+    )
     args = parser.parse_args()
 
     url = URL.create(args.url)
-    Browser(args.rtl).load(url)
+    Browser(args.rtl, args.max_parallel_requests).load(url)
     tkinter.mainloop()
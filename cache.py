@@ -1,4 +1,9 @@
 import time
+from collections import OrderedDict
+from typing import Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
 
 
 def now() -> int:
@@ -45,4 +50,39 @@ class BrowserCache:
                 self.remove(key)
 
 
+# Keeps at most `max_size` entries, evicting the least recently used one first
+class LRUCache(Generic[K, V]):
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._cache: OrderedDict[K, V] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: K) -> V | None:
+        value = self._cache.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._cache.move_to_end(key)
+        return value
+
+    def add(self, key: K, value: V):
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def clear(self):
+        self._cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
+
+
 browser_cache = BrowserCache()
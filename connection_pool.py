@@ -0,0 +1,154 @@
+from dataclasses import dataclass, field
+from io import BufferedReader
+import socket
+import ssl
+import threading
+import time
+from typing import Callable
+
+PoolKey = tuple[str, str, int]
+Socket = ssl.SSLSocket | socket.socket
+
+MAX_CONNECTIONS_PER_HOST = 6
+IDLE_TIMEOUT_S = 15
+# How long to wait for another request to the same host to free up a connection
+ACQUIRE_TIMEOUT_S = 30
+
+
+def monotonic() -> float:
+    return time.monotonic()
+
+
+@dataclass
+class PooledConnection:
+    key: PoolKey
+    sock: Socket
+    reused: bool = False
+    last_used: float = field(default_factory=monotonic)
+    _reader: BufferedReader | None = None
+
+    # The reader is created lazily and kept for the lifetime of the socket, since
+    # a buffered reader may already hold bytes belonging to the next response
+    @property
+    def reader(self) -> BufferedReader:
+        if self._reader is None:
+            self._reader = self.sock.makefile("rb", newline="\r\n")
+        return self._reader
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+        self.sock.close()
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        max_per_host: int = MAX_CONNECTIONS_PER_HOST,
+        idle_timeout: float = IDLE_TIMEOUT_S,
+        acquire_timeout: float = ACQUIRE_TIMEOUT_S,
+    ):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.hits = 0
+        self.misses = 0
+
+        self._idle: dict[PoolKey, list[PooledConnection]] = {}
+        self._active: dict[PoolKey, int] = {}
+        self._lock = threading.Condition()
+
+    def acquire(self, key: PoolKey, connect: Callable[[], Socket]) -> PooledConnection:
+        deadline = monotonic() + self.acquire_timeout
+        with self._lock:
+            while True:
+                self._evict_expired()
+                idle = self._idle.get(key)
+                if idle:
+                    conn = idle.pop()
+                    if not idle:
+                        del self._idle[key]
+                    conn.reused = True
+                    self._active[key] = self._active.get(key, 0) + 1
+                    self.hits += 1
+                    return conn
+
+                # No idle connections left, so every open connection is an active one
+                if self._active.get(key, 0) < self.max_per_host:
+                    self._active[key] = self._active.get(key, 0) + 1
+                    self.misses += 1
+                    break
+
+                # A connection that is never released must not block the host forever
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"No connection to {key[1]}:{key[2]} became free"
+                        f" within {self.acquire_timeout}s"
+                    )
+                self._lock.wait(remaining)
+
+        try:
+            return PooledConnection(key, connect())
+        except BaseException:
+            self._finish(key)
+            raise
+
+    # Only release connections whose response has been read in full
+    def release(self, conn: PooledConnection):
+        conn.last_used = monotonic()
+        with self._lock:
+            self._evict_expired()
+            self._idle.setdefault(conn.key, []).append(conn)
+            self._finish(conn.key)
+
+    def discard(self, conn: PooledConnection):
+        conn.close()
+        with self._lock:
+            self._finish(conn.key)
+
+    # Connections in use aren't the pool's to close, so they stay counted as active
+    # until they are released or discarded
+    def clear(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle = {}
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "idle": sum(len(conns) for conns in self._idle.values()),
+                "active": sum(self._active.values()),
+            }
+
+    def _finish(self, key: PoolKey):
+        with self._lock:
+            self._active[key] -= 1
+            if not self._active[key]:
+                del self._active[key]
+            self._lock.notify_all()
+
+    # Expires idle connections to every host, not just the one being requested, so
+    # hosts that are never visited again don't keep their sockets open
+    def _evict_expired(self):
+        cutoff = monotonic() - self.idle_timeout
+        for key, idle in list(self._idle.items()):
+            fresh = []
+            for conn in idle:
+                if conn.last_used > cutoff:
+                    fresh.append(conn)
+                else:
+                    conn.close()
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+
+
+connection_pool = ConnectionPool()
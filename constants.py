@@ -1,6 +1,24 @@
 WIDTH, HEIGHT = 800, 600
 HSTEP, VSTEP = 13, 18
 SCROLL_STEP = 100
+# Minimum time between relayouts while the window is being resized
+RESIZE_THROTTLE_MS = 50
+
+# Upper bound on concurrent subresource requests, e.g. for stylesheets
+MAX_PARALLEL_REQUESTS = 6
+MAX_ASYNC_REQUESTS = 256
+
+# Size of the buffer response bodies are streamed through
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Number of distinct parsed inline styles and stylesheets kept around for reuse
+INLINE_STYLE_CACHE_SIZE = 1024
+STYLESHEET_CACHE_SIZE = 64
+
+# Number of (font, text) widths remembered, so layout rarely has to ask Tk
+MEASURE_CACHE_SIZE = 100_000
+# Number of inline blocks whose lines are kept, for laying them out again for free
+LAYOUT_CACHE_SIZE = 10_000
 
 SELF_CLOSING_TAGS = [
     "area",
@@ -0,0 +1,83 @@
+from typing import Iterator, Literal, Mapping
+
+FontStyle = Literal["roman", "italic"]
+FontWeight = Literal["normal", "bold"]
+
+DEFAULT_FONT_SIZE_PX = 16.0
+
+
+def validate_weight(weight: str) -> FontWeight:
+    if weight == "normal" or weight == "bold":
+        return weight
+    return "normal"
+
+
+def validate_style(style: str) -> FontStyle:
+    if style == "roman" or style == "italic":
+        return style
+    return "roman"
+
+
+# Computed styles are shared between nodes, so they can't be modified once created.
+# Besides the string values, the properties layout reads for every word are kept in
+# typed form, so they're only parsed once when the style is computed.
+class ComputedStyle(Mapping[str, str]):
+    __slots__ = (
+        "values",
+        "font_size_px",
+        "font_size",
+        "font_weight",
+        "font_style",
+        "font_family",
+        "color",
+    )
+
+    def __init__(
+        self, values: dict[str, str], font_size_px: float = DEFAULT_FONT_SIZE_PX
+    ):
+        self.values = values
+        self.font_size_px = font_size_px
+        # Tk font sizes are in points
+        self.font_size = int(font_size_px * 0.75)
+        self.font_weight = validate_weight(values.get("font-weight", "normal"))
+        self.font_style = validate_style(values.get("font-style", "roman"))
+        self.font_family = values.get("font-family", "")
+        self.color = values.get("color", "black")
+
+    def __getitem__(self, property: str) -> str:
+        return self.values[property]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __repr__(self) -> str:
+        return f"ComputedStyle({self.values!r})"
+
+
+# Keys are built from the identities of the parent's style and the matched rules, so
+# a cache must not outlive the rules it was used with
+StyleKey = tuple[int, str | None, tuple[int, ...]]
+
+
+class StyleCache:
+    def __init__(self):
+        self.styles: dict[StyleKey, ComputedStyle] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: StyleKey) -> ComputedStyle | None:
+        style = self.styles.get(key)
+        if style is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return style
+
+    def add(self, key: StyleKey, style: ComputedStyle):
+        self.styles[key] = style
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.styles)}
@@ -1,5 +1,52 @@
-from css.selectors import CSSRule, DescendantSelector, SelectorRule, TagSelector
-from web_html.node import Element, Node
+import functools
+import hashlib
+import os
+import pickle
+import re
+from types import MappingProxyType
+
+from cache import LRUCache
+from constants import INLINE_STYLE_CACHE_SIZE, STYLESHEET_CACHE_SIZE
+from css.computed import DEFAULT_FONT_SIZE_PX, ComputedStyle, StyleCache
+from css.rule_index import RuleIndex
+from css.selectors import (
+    AncestorFilter,
+    ClassSelector,
+    CompoundSelector,
+    CSSRule,
+    DescendantSelector,
+    IdSelector,
+    NodeSelector,
+    Selector,
+    SelectorRule,
+    SimpleSelector,
+    TagSelector,
+    cascade_priority,
+)
+from web_html.node import Element, Node, Style
+
+# A word is a run of letters, digits and #-.%" characters. Possessive quantifiers
+# stop the scanner from backtracking into text it has already matched.
+WORD_PATTERN = r'(?:[^\W_]|[#\-.%"])++'
+WHITESPACE = re.compile(r"\s*+")
+WORD = re.compile(WORD_PATTERN)
+SELECTOR = re.compile(rf"{WORD_PATTERN}(?:\s++{WORD_PATTERN})*+\s*+")
+# Splits a word like nav.links into a tag, classes and ids. Names can't be empty.
+SIMPLE_SELECTOR = re.compile(r"([#.]?+)([^#.]++)")
+COMPOUND_SELECTOR = re.compile(r"(?:[#.]?+[^#.]++)++")
+DECLARATION = re.compile(
+    rf"({WORD_PATTERN})\s*+:\s*+((?:{WORD_PATTERN}(?:\s++{WORD_PATTERN})*+)?+)\s*+;\s*+"
+)
+
+# Found next to the browser's code, whatever directory it's run from
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STYLESHEET = os.path.join(ROOT_DIR, "browser.css")
+COMPILED_STYLESHEET = os.path.join(ROOT_DIR, "__pycache__", "browser.css.pickle")
+# Compiled rules depend on the code that parses them and defines their classes
+COMPILER_SOURCES = [
+    os.path.join(ROOT_DIR, "css", "parser.py"),
+    os.path.join(ROOT_DIR, "css", "selectors.py"),
+]
 
 INHERITED_PROPERTIES: CSSRule = {
     "color": "black",
@@ -23,86 +70,86 @@ class CSSParser:
         return self.i < len(self.text)
 
     def consume_whitespace(self):
-        while self.more_to_parse() and self.curr_char.isspace():
-            self.i += 1
+        self.i = WHITESPACE.match(self.text, self.i).end()  # type: ignore
 
     def consume_word(self) -> str:
-        start = self.i
+        match = WORD.match(self.text, self.i)
+        if match is None:
+            raise Exception(f"Parsing error: no word at {self.i}")
 
-        while self.more_to_parse():
-            if self.curr_char.isalnum() or self.curr_char in '#-.%"':
-                self.i += 1
-            else:
-                break
-
-        if not (self.i > start):
-            raise Exception(f"Parsing error: {self.i} is not greater than {start}")
-
-        return self.text[start : self.i]
+        self.i = match.end()
+        return match.group()
 
     def consume_literal(self, literal: str):
-        if self.more_to_parse() and self.curr_char == literal:
-            self.i += 1
+        if self.text.startswith(literal, self.i):
+            self.i += len(literal)
         else:
             raise Exception(f"Parsing error: {literal} not matched")
 
-    def parse_declaration(self) -> tuple[str, str]:
-        prop = self.consume_word()
-        self.consume_whitespace()
-        self.consume_literal(":")
-        self.consume_whitespace()
-
-        # CSS values may be multiple words, separated by whitespace
-        val = ""
-        while self.curr_char != ";":
-            val += self.consume_word()
-
-            if self.curr_char.isspace():
-                self.consume_whitespace()
-                val += " "
-
-        return prop.casefold(), val.strip()
-
     def parse_declaration_block(self) -> dict[str, str]:
         pairs: dict[str, str] = {}
-
-        while self.more_to_parse() and self.curr_char != "}":
-            try:
-                prop, val = self.parse_declaration()
-                pairs[prop.casefold()] = val
-                self.consume_whitespace()
+        text = self.text
+
+        while self.i < len(text) and text[self.i] != "}":
+            match = DECLARATION.match(text, self.i)
+            if match is not None:
+                prop, val = match.groups()
+                # CSS values may be multiple words, separated by whitespace
+                pairs[prop.casefold()] = " ".join(val.split())
+                self.i = match.end()
+                continue
+
+            why = self.ignore_until([";", "}"])
+            if why == ";":
                 self.consume_literal(";")
                 self.consume_whitespace()
-            except Exception:
-                why = self.ignore_until([";", "}"])
-                if why == ";":
-                    self.consume_literal(";")
-                    self.consume_whitespace()
-                else:
-                    break
+            else:
+                break
 
         return pairs
 
     def ignore_until(self, chars: list[str]) -> str | None:
-        while self.more_to_parse():
-            if self.curr_char in chars:
-                return self.curr_char
-            else:
-                self.i += 1
-
-        return None
-
-    def parse_selector(self) -> TagSelector | DescendantSelector:
-        out = TagSelector(self.consume_word().casefold())
-        self.consume_whitespace()
+        positions = [self.text.find(char, self.i) for char in chars]
+        found = [i for i in positions if i >= 0]
+        if not found:
+            self.i = len(self.text)
+            return None
+
+        self.i = min(found)
+        return self.curr_char
+
+    def parse_selector(self) -> Selector:
+        match = SELECTOR.match(self.text, self.i)
+        if match is None:
+            raise Exception(f"Parsing error: no selector at {self.i}")
+
+        words = match.group().split()
+        out: Selector = self.parse_node_selector(words[0])
+        for word in words[1:]:
+            out = DescendantSelector(out, self.parse_node_selector(word))
+
+        self.i = match.end()
+        return out
 
-        while self.more_to_parse() and self.curr_char != "{":
-            tag = self.consume_word()
-            descendant = TagSelector(tag.casefold())
-            out = DescendantSelector(out, descendant)
-            self.consume_whitespace()
+    # Parses a single word of a selector, like p, .note, #main or nav.links
+    def parse_node_selector(self, word: str) -> NodeSelector:
+        if "." not in word and "#" not in word:
+            return TagSelector(word.casefold())
+        if not COMPOUND_SELECTOR.fullmatch(word):
+            raise Exception(f"Parsing error: invalid selector {word}")
+
+        parts: list[SimpleSelector] = []
+        for prefix, name in SIMPLE_SELECTOR.findall(word):
+            if prefix == "#":
+                parts.append(IdSelector(name))
+            elif prefix == ".":
+                parts.append(ClassSelector(name))
+            else:
+                parts.append(TagSelector(name.casefold()))
 
-        return out
+        if len(parts) == 1:
+            return parts[0]
+        return CompoundSelector(parts)
 
     def parse(self) -> list[SelectorRule]:
         rules: list[SelectorRule] = []
@@ -127,51 +174,213 @@ class CSSParser:
         return rules
 
 
-def get_default_stylesheet() -> list[SelectorRule]:
-    with open("browser.css", "r") as file:
-        text = file.read()
-        return CSSParser(text).parse()
+@functools.cache
+def compiler_version() -> str:
+    digest = hashlib.sha256()
+    for path in COMPILER_SOURCES:
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+# Like a .pyc file, the compiled rules are only used while the stylesheet's mtime and
+# size, and the code that compiled them, match
+def load_stylesheet(path: str, compiled_path: str) -> list[SelectorRule]:
+    stat = os.stat(path)
+    version = (compiler_version(), stat.st_mtime_ns, stat.st_size)
+    try:
+        with open(compiled_path, "rb") as file:
+            compiled_version, rules = pickle.load(file)
+        if compiled_version == version:
+            return rules
+    # Anything can go wrong unpickling a stale file, so it's just compiled again
+    except Exception:
+        pass
+
+    with open(path, "r") as file:
+        rules = sorted(CSSParser(file.read()).parse(), key=cascade_priority)
+
+    # Write to a temporary file first, so concurrent processes never read half a file
+    try:
+        os.makedirs(os.path.dirname(compiled_path), exist_ok=True)
+        temp_path = f"{compiled_path}.{os.getpid()}"
+        with open(temp_path, "wb") as file:
+            pickle.dump((version, rules), file)
+        os.replace(temp_path, compiled_path)
+    except OSError:
+        pass
+    return rules
+
+
+# Parsed results are shared between every node and page with the same source text, so
+# they're returned read-only
+inline_style_cache: LRUCache[str, CSSRule] = LRUCache(INLINE_STYLE_CACHE_SIZE)
+stylesheet_cache: LRUCache[bytes, tuple[SelectorRule, ...]] = LRUCache(
+    STYLESHEET_CACHE_SIZE
+)
+
+
+def parse_inline_style(text: str) -> CSSRule:
+    declarations = inline_style_cache.get(text)
+    if declarations is None:
+        declarations = MappingProxyType(CSSParser(text).parse_declaration_block())
+        inline_style_cache.add(text, declarations)
+    return declarations
+
+
+# Stylesheets can be large, so they're keyed by a digest rather than their text
+def parse_stylesheet(text: str) -> tuple[SelectorRule, ...]:
+    key = hashlib.sha256(text.encode()).digest()
+    rules = stylesheet_cache.get(key)
+    if rules is None:
+        rules = tuple(
+            (selector, MappingProxyType(body))
+            for selector, body in CSSParser(text).parse()
+        )
+        stylesheet_cache.add(key, rules)
+    return rules
+
+
+# Parsed once per process and shared by every page, so the rules are read-only and
+# already sorted by `cascade_priority`
+@functools.cache
+def get_default_stylesheet() -> tuple[SelectorRule, ...]:
+    rules = load_stylesheet(DEFAULT_STYLESHEET, COMPILED_STYLESHEET)
+    return tuple((selector, MappingProxyType(body)) for selector, body in rules)
+
+
+def compute_style(
+    parent_style: Style | None, matched_rules: list[CSSRule], inline_style: str | None
+) -> ComputedStyle:
+    computed: dict[str, str] = {}
 
-
-def style(node: Node, rules: list[SelectorRule]):
     # Apply any inherited styles to the node first
     for property, default_value in INHERITED_PROPERTIES.items():
-        if node.parent:
-            node.style[property] = node.parent.style[property]
+        if parent_style:
+            computed[property] = parent_style[property]
         else:
-            node.style[property] = default_value
+            computed[property] = default_value
 
     # Then handle custom stylesheets
-    for selector, body in rules:
-        if not selector.matches(node):
-            continue
-        if isinstance(node, Element) and node.tag in ["html", "head"]:
-            continue
+    for body in matched_rules:
         for property, value in body.items():
-            node.style[property] = value
+            computed[property] = value
 
     # Then handle inline styles, which override stylesheet CSS rules
-    if isinstance(node, Element) and "style" in node.attributes:
-        pairs = CSSParser(node.attributes["style"]).parse_declaration_block()
+    if inline_style is not None:
+        pairs = parse_inline_style(inline_style)
         for prop, val in pairs.items():
-            node.style[prop] = val
+            computed[prop] = val
 
     # HACK tkinter expects a single font-family, so grab the first one
-    if node.style["font-family"]:
-        font_family = node.style["font-family"].split(",")[0]
+    if computed["font-family"]:
+        font_family = computed["font-family"].split(",")[0]
         font_family = font_family.replace('"', "").replace("'", "")
-        node.style["font-family"] = font_family
-
-    # Compute final font sizes for percentage size values
-    if node.style["font-size"].endswith("%"):
-        if node.parent:
-            parent_font_size = node.parent.style["font-size"]
-        else:
-            parent_font_size = INHERITED_PROPERTIES["font-size"]
+        computed["font-family"] = font_family
 
-        node_pct = float(node.style["font-size"][:-1]) / 100
-        parent_px = float(parent_font_size[:-2])
-        node.style["font-size"] = str(node_pct * parent_px) + "px"
+    if parent_style:
+        parent_px = parent_style.font_size_px
+    else:
+        parent_px = DEFAULT_FONT_SIZE_PX
 
+    # Compute final font sizes for percentage size values
+    font_size = computed["font-size"]
+    if font_size.endswith("%"):
+        node_pct = float(font_size[:-1]) / 100
+        font_size_px = node_pct * parent_px
+        computed["font-size"] = str(font_size_px) + "px"
+    else:
+        font_size_px = parse_px(font_size, parent_px)
+
+    return ComputedStyle(computed, font_size_px)
+
+
+# Treats any two-letter unit as px, and falls back to the inherited size for values
+# that can't be parsed
+def parse_px(value: str, default: float) -> float:
+    try:
+        return float(value[:-2])
+    except ValueError:
+        return default
+
+
+def compute_node_style(
+    node: Node, rules: RuleIndex, ancestors: AncestorFilter, cache: StyleCache
+) -> ComputedStyle:
+    parent_style = node.parent.style if node.parent else None
+    if isinstance(node, Element) and node.tag in ["html", "head"]:
+        matched_rules = []
+    else:
+        matched_rules = rules.matching_rules(node, ancestors)
+    inline_style = node.attributes.get("style") if isinstance(node, Element) else None
+
+    # A computed style only depends on these, so siblings and cousins that agree on
+    # all of them can share a single style object
+    key = (
+        id(parent_style),
+        inline_style,
+        tuple(id(body) for body in matched_rules),
+    )
+    computed = cache.get(key)
+    if computed is None:
+        computed = compute_style(parent_style, matched_rules, inline_style)
+        cache.add(key, computed)
+    return computed
+
+
+def style(
+    node: Node,
+    rules: list[SelectorRule] | RuleIndex,
+    ancestors: AncestorFilter | None = None,
+    cache: StyleCache | None = None,
+):
+    if not isinstance(rules, RuleIndex):
+        rules = RuleIndex(rules)
+    if ancestors is None:
+        ancestors = AncestorFilter()
+    if cache is None:
+        cache = StyleCache()
+
+    node.style = compute_node_style(node, rules, ancestors, cache)
+    node.style_dirty = False
+
+    ancestors.push(node)
+    for child in node.children:
+        style(child, rules, ancestors, cache)
+    ancestors.pop(node)
+    node.child_dirty = False
+
+
+def inherited_properties_changed(old: Style, new: Style) -> bool:
+    if old is new:
+        return False
+    return any(old.get(property) != new[property] for property in INHERITED_PROPERTIES)
+
+
+# Only restyles dirty nodes, and the children of nodes whose inherited properties
+# changed as a result. Expects to be called on the root of the tree.
+def restyle(
+    node: Node,
+    rules: RuleIndex,
+    cache: StyleCache,
+    ancestors: AncestorFilter | None = None,
+    force: bool = False,
+):
+    if ancestors is None:
+        ancestors = AncestorFilter()
+
+    inherited_changed = False
+    if force or node.style_dirty:
+        old_style = node.style
+        node.style = compute_node_style(node, rules, ancestors, cache)
+        node.style_dirty = False
+        inherited_changed = inherited_properties_changed(old_style, node.style)
+
+    if not (inherited_changed or node.child_dirty):
+        return
+
+    ancestors.push(node)
     for child in node.children:
-        style(child, rules)
+        restyle(child, rules, cache, ancestors, inherited_changed)
+    ancestors.pop(node)
+    node.child_dirty = False
@@ -0,0 +1,69 @@
+import heapq
+
+from css.selectors import (
+    AncestorFilter,
+    CSSRule,
+    DescendantSelector,
+    Selector,
+    SelectorRule,
+    filter_keys,
+)
+from web_html.node import Element, Node
+
+# Rules remember their position in the cascade, so buckets can be merged back in order
+IndexedRule = tuple[int, Selector, CSSRule]
+
+
+# Only the rightmost selector has to match the node itself, so that decides the bucket.
+# Ids are the most selective, then classes, then tags.
+def subject_key(selector: Selector) -> str:
+    if isinstance(selector, DescendantSelector):
+        selector = selector.chain[-1]
+    keys = selector.keys
+    for prefix in "#.":
+        for key in keys:
+            if key.startswith(prefix):
+                return key
+    return keys[0]
+
+
+# Buckets rules by the id, class or tag they can apply to, using the same keys as
+# `AncestorFilter`, so styling a node only looks at rules that could possibly match
+# it. Expects rules already sorted by `cascade_priority`, and keeps that order.
+class RuleIndex:
+    def __init__(self, rules: list[SelectorRule]):
+        self.rules = rules
+        self.buckets: dict[str, list[IndexedRule]] = {}
+        for i, (selector, body) in enumerate(rules):
+            self.buckets.setdefault(subject_key(selector), []).append(
+                (i, selector, body)
+            )
+
+        # Counters for profiling how much work selector matching does
+        self.examined = 0
+        self.matched = 0
+
+    def matching_rules(
+        self, node: Node, ancestors: AncestorFilter | None = None
+    ) -> list[CSSRule]:
+        if not isinstance(node, Element):
+            return []
+
+        buckets = [
+            self.buckets[key] for key in filter_keys(node) if key in self.buckets
+        ]
+        if not buckets:
+            return []
+        candidates = buckets[0] if len(buckets) == 1 else list(heapq.merge(*buckets))
+
+        matches = [
+            body
+            for _, selector, body in candidates
+            if selector.matches(node, ancestors)
+        ]
+        self.examined += len(candidates)
+        self.matched += len(matches)
+        return matches
+
+    def stats(self) -> dict[str, int]:
+        return {"examined": self.examined, "matched": self.matched}
@@ -1,14 +1,47 @@
+import heapq
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Self
+from typing import Iterable, Mapping, Self
 from web_html.node import Element, Node
 
-CSSRule = dict[str, str]
+CSSRule = Mapping[str, str]
+
+
+# Counts the tags, ids and classes of the current node's ancestors while styling walks
+# down the tree, so descendant selectors can rule themselves out without walking back
+# up. Ids are counted as "#id" and classes as ".class", so they never clash with tags.
+class AncestorFilter:
+    def __init__(self):
+        self.counts: dict[str, int] = {}
+
+    def push(self, node: Node):
+        if isinstance(node, Element):
+            for key in filter_keys(node):
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def pop(self, node: Node):
+        if isinstance(node, Element):
+            for key in filter_keys(node):
+                self.counts[key] -= 1
+
+    def contains_all(self, keys: frozenset[str]) -> bool:
+        return all(self.counts.get(key) for key in keys)
+
+
+def filter_keys(node: Element) -> list[str]:
+    keys = [node.tag]
+    if "id" in node.attributes:
+        keys.append("#" + node.attributes["id"])
+    for name in node.classes:
+        keys.append("." + name)
+    return keys
 
 
 class AbstractSelector(ABC):
+    priority: int
+
     @abstractmethod
-    def matches(self, node: Node):
+    def matches(self, node: Node, ancestors: AncestorFilter | None = None):
         pass
 
 
@@ -17,31 +50,113 @@ class TagSelector(AbstractSelector):
     tag: str
     priority: int = 1
 
-    def matches(self, node: Node):
+    def matches(self, node: Node, ancestors: AncestorFilter | None = None):
         return isinstance(node, Element) and self.tag == node.tag
 
+    @property
+    def keys(self) -> list[str]:
+        return [self.tag]
+
+
+@dataclass
+class ClassSelector(AbstractSelector):
+    name: str
+    priority: int = 10
+
+    def matches(self, node: Node, ancestors: AncestorFilter | None = None):
+        return isinstance(node, Element) and self.name in node.classes
+
+    @property
+    def keys(self) -> list[str]:
+        return ["." + self.name]
+
+
+@dataclass
+class IdSelector(AbstractSelector):
+    name: str
+    priority: int = 100
+
+    def matches(self, node: Node, ancestors: AncestorFilter | None = None):
+        return isinstance(node, Element) and node.attributes.get("id") == self.name
+
+    @property
+    def keys(self) -> list[str]:
+        return ["#" + self.name]
+
+
+SimpleSelector = TagSelector | ClassSelector | IdSelector
+
+
+# Several simple selectors that must all match the same node, like nav.links
+class CompoundSelector(AbstractSelector):
+    def __init__(self, parts: list[SimpleSelector]):
+        self.parts = parts
+        self.priority: int = sum(part.priority for part in parts)
+
+    def matches(self, node: Node, ancestors: AncestorFilter | None = None):
+        return all(part.matches(node) for part in self.parts)
+
+    @property
+    def keys(self) -> list[str]:
+        return [key for part in self.parts for key in part.keys]
+
+
+NodeSelector = SimpleSelector | CompoundSelector
+
 
 class DescendantSelector(AbstractSelector):
-    def __init__(self, ancestor: TagSelector | Self, descendant: TagSelector | Self):
+    def __init__(self, ancestor: NodeSelector | Self, descendant: NodeSelector | Self):
         self.ancestor = ancestor
         self.descendant = descendant
         self.priority: int = ancestor.priority + descendant.priority
 
-    def matches(self, node: Node):
-        if not self.descendant.matches(node):
+        # Flattened from the outermost ancestor down to the node itself
+        chain = self._flatten(ancestor) + self._flatten(descendant)
+        self.chain: list[NodeSelector] = chain
+        self.ancestor_keys = frozenset(
+            key for selector in self.chain[:-1] for key in selector.keys
+        )
+
+    def _flatten(self, selector: NodeSelector | Self) -> list[NodeSelector]:
+        if isinstance(selector, DescendantSelector):
+            return selector.chain
+        return [selector]
+
+    def matches(self, node: Node, ancestors: AncestorFilter | None = None):
+        if not self.chain[-1].matches(node):
+            return False
+        if ancestors is not None and not ancestors.contains_all(self.ancestor_keys):
             return False
 
+        # Matching each selector against the nearest ancestor it can is always safe,
+        # so a single walk up the tree is enough
+        i = len(self.chain) - 2
         while node.parent:
-            if self.ancestor.matches(node.parent):
-                return True
             node = node.parent
+            if self.chain[i].matches(node):
+                i -= 1
+                if i < 0:
+                    return True
 
         return False
 
 
-SelectorRule = tuple[TagSelector | DescendantSelector, CSSRule]
+Selector = NodeSelector | DescendantSelector
+SelectorRule = tuple[Selector, CSSRule]
 
 
 def cascade_priority(rule: SelectorRule) -> int:
     selector, body = rule
     return selector.priority
+
+
+# Same order as sorting all of the rules together, without re-sorting rules that are
+# already in cascade order. Ties go to the earlier list, like a stable sort.
+def merge_rules(
+    sorted_rules: Iterable[SelectorRule], new_rules: Iterable[SelectorRule]
+) -> list[SelectorRule]:
+    return list(
+        heapq.merge(
+            sorted_rules, sorted(new_rules, key=cascade_priority), key=cascade_priority
+        )
+    )
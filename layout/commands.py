@@ -1,18 +1,21 @@
 from dataclasses import dataclass
-import tkinter.font
+import tkinter
+
+from layout.font_backends import Font
+from layout.fonts import get_metrics
 
 
 @dataclass
 class DrawText:
     color: str
-    font: tkinter.font.Font
+    font: Font
     left: float
     text: str
     top: float
 
     @property
     def bottom(self) -> float:
-        return self.top + self.font.metrics().get("linespace")
+        return self.top + get_metrics(self.font).linespace
 
     def execute(self, scroll: float, canvas: tkinter.Canvas):
         canvas.create_text(
@@ -0,0 +1,167 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+import itertools
+import json
+import os
+import tkinter
+import tkinter.font
+
+from css.computed import FontStyle, FontWeight
+
+FONT_METRICS_PATH = os.path.join(os.path.dirname(__file__), "font_metrics.json")
+
+
+@dataclass(frozen=True)
+class FontFace:
+    # In font units, see `units_per_em` in the metrics file
+    ascent: int
+    descent: int
+    widths: dict[str, int]
+    default_width: int
+
+
+# Stands in for tkinter.font.Font during layout, but measures text with advance widths
+# from a metrics file instead of asking Tk, so it works without a display
+class HeadlessFont:
+    def __init__(
+        self,
+        name: str,
+        family: str,
+        size: int,
+        weight: FontWeight,
+        slant: FontStyle,
+        face: FontFace,
+        units_per_em: int,
+    ):
+        self.name = name
+        self.options: dict[str, str | int] = {
+            "family": family,
+            "size": size,
+            "weight": weight,
+            "slant": slant,
+            "underline": 0,
+            "overstrike": 0,
+        }
+        self.face = face
+
+        # Like Tk, positive sizes are in points and negative ones in pixels. Points
+        # are converted at 96 dpi.
+        pixels = size * 4 / 3 if size > 0 else -size
+        self.scale = pixels / units_per_em
+        # Glyphs advance by whole pixels, like hinted screen fonts, so the width of a
+        # string is the sum of the widths of its parts
+        self.advances = {
+            char: round(width * self.scale) for char, width in face.widths.items()
+        }
+        self.default_advance = round(face.default_width * self.scale)
+        ascent = round(face.ascent * self.scale)
+        descent = round(face.descent * self.scale)
+        fixed = len(set(face.widths.values())) == 1
+        self._metrics = {
+            "ascent": ascent,
+            "descent": descent,
+            "linespace": ascent + descent,
+            "fixed": int(fixed),
+        }
+
+    def __repr__(self) -> str:
+        return f"HeadlessFont({self.name!r}, {self.options!r})"
+
+    def cget(self, option: str) -> str | int:
+        return self.options[option]
+
+    def __getitem__(self, option: str) -> str | int:
+        return self.cget(option)
+
+    def measure(self, text: str) -> int:
+        advances = self.advances
+        default_advance = self.default_advance
+        return sum([advances.get(char, default_advance) for char in text])
+
+    def metrics(self, *options: str) -> dict[str, int] | int:
+        if options:
+            return self._metrics[options[0]]
+        return dict(self._metrics)
+
+
+Font = tkinter.font.Font | HeadlessFont
+
+
+class FontBackend(ABC):
+    @abstractmethod
+    def default_family(self) -> str:
+        pass
+
+    @abstractmethod
+    def create_font(
+        self, family: str, size: int, weight: FontWeight, style: FontStyle
+    ) -> Font:
+        pass
+
+
+class TkFontBackend(FontBackend):
+    def __init__(self):
+        # Tk measures a font faster once a widget uses it
+        self.labels: list[tkinter.Label] = []
+
+    def default_family(self) -> str:
+        return tkinter.font.nametofont("TkDefaultFont").cget("family")
+
+    def create_font(
+        self, family: str, size: int, weight: FontWeight, style: FontStyle
+    ) -> Font:
+        font = tkinter.font.Font(
+            family=family,
+            size=size,
+            weight=weight,
+            slant=style,
+        )
+        self.labels.append(tkinter.Label(font=font))
+        return font
+
+
+# Pure Python and deterministic, for laying out pages in tests and batch jobs. Italic
+# text uses the upright widths, and unknown families fall back to the default face.
+class HeadlessFontBackend(FontBackend):
+    def __init__(self, path: str = FONT_METRICS_PATH):
+        with open(path, "r") as file:
+            data = json.load(file)
+
+        self.units_per_em: int = data["units_per_em"]
+        self.family: str = data["default_family"]
+        self.aliases: dict[str, str] = {}
+        self.faces: dict[tuple[str, str], FontFace] = {}
+
+        # Width tables list every character from `first_char` onwards
+        first_char = data["first_char"]
+        for name, face in data["faces"].items():
+            for alias in [name, *face["aliases"]]:
+                self.aliases[alias.casefold()] = name
+            for weight, widths in face["widths"].items():
+                self.faces[(name, weight)] = FontFace(
+                    ascent=face["ascent"],
+                    descent=face["descent"],
+                    widths={
+                        chr(first_char + i): width for i, width in enumerate(widths)
+                    },
+                    default_width=face["default_width"][weight],
+                )
+
+        self.names = itertools.count(1)
+
+    def default_family(self) -> str:
+        return self.family
+
+    def create_font(
+        self, family: str, size: int, weight: FontWeight, style: FontStyle
+    ) -> Font:
+        face_name = self.aliases.get(family.casefold(), self.family)
+        return HeadlessFont(
+            name=f"headless{next(self.names)}",
+            family=family,
+            size=size,
+            weight=weight,
+            slant=style,
+            face=self.faces[(face_name, weight)],
+            units_per_em=self.units_per_em,
+        )
@@ -1,57 +1,115 @@
-import tkinter.font
-from typing import Literal
+from dataclasses import dataclass
+from typing import Sequence
 
+from cache import LRUCache
+from constants import MEASURE_CACHE_SIZE
+from css.computed import FontStyle, FontWeight, validate_style, validate_weight
+from layout.font_backends import Font, FontBackend, TkFontBackend
 from web_html.node import Node
 
 
-FontStyle = Literal["roman", "italic"]
-FontWeight = Literal["normal", "bold"]
 FontCacheKey = tuple[str, int, FontWeight, FontStyle]
 
-FONTS: dict[FontCacheKey, tuple[tkinter.font.Font, tkinter.Label]] = {}
+FONTS: dict[FontCacheKey, Font] = {}
 
+font_backend: FontBackend = TkFontBackend()
 
-def get_default_font_family() -> str:
-    return tkinter.font.nametofont("TkDefaultFont").cget("family")
+# Measuring text is a round trip into Tk, so widths are cached by the font's name,
+# which is unique to each font in FONTS
+MEASUREMENTS: LRUCache[tuple[str, str], int] = LRUCache(MEASURE_CACHE_SIZE)
+SPACE_WIDTHS: dict[str, int] = {}
+
+
+# A font's metrics never change, so they're only fetched from Tk once per font
+@dataclass(frozen=True)
+class FontMetrics:
+    ascent: int
+    descent: int
+    linespace: int
 
 
-def validate_weight(weight: str) -> FontWeight:
-    if weight == "normal" or weight == "bold":
-        return weight
-    return "normal"
+METRICS: dict[str, FontMetrics] = {}
 
 
-def validate_style(style: str) -> FontStyle:
-    if style == "roman" or style == "italic":
-        return style
-    return "roman"
+# Switches between measuring with Tk and without it, e.g. with a HeadlessFontBackend
+def set_font_backend(backend: FontBackend):
+    global font_backend
+    font_backend = backend
 
+    # Cached fonts and measurements all came from the old backend
+    FONTS.clear()
+    MEASUREMENTS.clear()
+    SPACE_WIDTHS.clear()
+    METRICS.clear()
+
+
+def get_default_font_family() -> str:
+    return font_backend.default_family()
 
-def get_font(size: int, weight: str, style: str, family: str = "") -> tkinter.font.Font:
+
+def get_font(size: int, weight: str, style: str, family: str = "") -> Font:
     family = family or get_default_font_family()
     weight = validate_weight(weight)
     style = validate_style(style)
     key = (family, size, weight, style)
     if key not in FONTS:
-        font = tkinter.font.Font(
-            family=family,
-            size=size,
-            weight=weight,
-            slant=style,
-        )
-        label = tkinter.Label(font=font)
-        FONTS[key] = (font, label)
-    return FONTS[key][0]
+        FONTS[key] = font_backend.create_font(family, size, weight, style)
+    return FONTS[key]
 
 
 def get_font_size_from_node(node: Node) -> int:
-    return int(float(node.style["font-size"][:-2]) * 0.75)
+    return node.style.font_size
 
 
-def get_font_from_node(node: Node) -> tkinter.font.Font:
+def get_font_from_node(node: Node) -> Font:
+    style = node.style
     return get_font(
-        size=get_font_size_from_node(node),
-        weight=node.style.get("font-weight", "normal"),
-        style=node.style.get("font-style", "roman"),
-        family=node.style.get("font-family", ""),
+        size=style.font_size,
+        weight=style.font_weight,
+        style=style.font_style,
+        family=style.font_family,
     )
+
+
+def measure(font: Font, text: str) -> int:
+    key = (font.name, text)
+    width = MEASUREMENTS.get(key)
+    if width is None:
+        width = font.measure(text)
+        MEASUREMENTS.add(key, width)
+    return width
+
+
+# Widths for a whole run of words in one font, so line breaking can work on them in bulk
+def measure_words(font: Font, words: Sequence[str]) -> list[int]:
+    name = font.name
+    widths = []
+    for word in words:
+        key = (name, word)
+        width = MEASUREMENTS.get(key)
+        if width is None:
+            width = font.measure(word)
+            MEASUREMENTS.add(key, width)
+        widths.append(width)
+    return widths
+
+
+def space_width(font: Font) -> int:
+    width = SPACE_WIDTHS.get(font.name)
+    if width is None:
+        width = font.measure(" ")
+        SPACE_WIDTHS[font.name] = width
+    return width
+
+
+def get_metrics(font: Font) -> FontMetrics:
+    metrics = METRICS.get(font.name)
+    if metrics is None:
+        values = font.metrics()
+        metrics = FontMetrics(
+            ascent=values["ascent"],
+            descent=values["descent"],
+            linespace=values["linespace"],
+        )
+        METRICS[font.name] = metrics
+    return metrics
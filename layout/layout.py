@@ -1,12 +1,26 @@
 from abc import ABC, abstractmethod
+from bisect import bisect_right
 from dataclasses import dataclass
-import tkinter.font
-from typing import Literal, Self
-
-from constants import BLOCK_ELEMENTS, HSTEP, VSTEP, WIDTH
+from itertools import accumulate
+from typing import Literal, Self, Sequence
+import weakref
+
+from cache import LRUCache
+from constants import BLOCK_ELEMENTS, HSTEP, LAYOUT_CACHE_SIZE, VSTEP, WIDTH
+from css.computed import ComputedStyle
+from layout import fonts
 from layout.commands import DrawRect, DrawText
-from layout.fonts import get_font, get_font_from_node, get_font_size_from_node
-from web_html.node import Element, Node, Text
+from layout.font_backends import Font, FontBackend
+from layout.fonts import (
+    get_font,
+    get_font_from_node,
+    get_font_size_from_node,
+    get_metrics,
+    measure,
+    measure_words,
+    space_width,
+)
+from web_html.node import Element, Node, PreLine, Text
 
 TextAlign = Literal["right", "left", "center"]
 
@@ -14,17 +28,43 @@ TextAlign = Literal["right", "left", "center"]
 @dataclass
 class LineItem:
     color: str
-    font: tkinter.font.Font
+    font: Font
     x: float
     valign: str
     word: str
+    width: float
+    # id() of the text node the word came from
+    source: int
 
 
+# Once flushed, `word` may hold a run of several words, and `width` covers all of them
 @dataclass
 class DisplayListItem(LineItem):
     y: float
 
 
+# The lines an inline block was broken into, for one version of the node. The node is
+# only weakly referenced, so cached layouts never keep a page's DOM alive. The style
+# and font backend are kept so an entry can't be mistaken for different objects that
+# reused their ids.
+@dataclass(frozen=True)
+class LayoutEntry:
+    node: weakref.ref[Node]
+    version: int
+    style: ComputedStyle
+    font_backend: FontBackend
+    display_list: list[DisplayListItem]
+    height: float
+
+
+# Keyed by the node's identity, its style, and the available width and direction. The
+# version is checked rather than keyed on, so a changed node replaces its old entries
+# instead of piling up new ones.
+LayoutKey = tuple[int, int, float, bool]
+
+LAYOUT_CACHE: LRUCache[LayoutKey, LayoutEntry] = LRUCache(LAYOUT_CACHE_SIZE)
+
+
 class AbstractLayout(ABC):
     @abstractmethod
     def __init__(self):
@@ -52,9 +92,11 @@ class DocumentLayout(AbstractLayout):
         self.height = 0
         self.rtl = rtl
 
+    # Can be called again after changing `width`, and reuses the existing layout tree
     def layout(self):
-        child = BlockLayout(self.node, self, None)
-        self.children.append(child)
+        if not self.children:
+            self.children.append(BlockLayout(self.node, self, None))
+        child = self.children[0]
         child.layout()
         self.height = child.height
 
@@ -73,7 +115,11 @@ class BlockLayout(AbstractLayout):
         self.parent = parent
         self.previous = previous
         self.children: list[BlockLayout] = []
+        # Positions are relative to the block, so moving it doesn't invalidate them
         self.display_list: list[DisplayListItem] = []
+        self.mode: Literal["inline"] | Literal["block"] | None = None
+        # Lines only need breaking again when the width they were broken at changes
+        self.line_width: float | None = None
 
         # Attributes below are used for inline text layout only
         self.cursor_x = 0
@@ -95,13 +141,6 @@ class BlockLayout(AbstractLayout):
     def is_matching_element(self, tag: str) -> bool:
         return isinstance(self.node, Element) and self.node.tag == tag
 
-    def has_css_class(self, class_name: str) -> bool:
-        return (
-            isinstance(self.node, Element)
-            and "class" in self.node.attributes
-            and class_name in self.node.attributes["class"]
-        )
-
     def layout_mode(self) -> Literal["inline"] | Literal["block"]:
         if isinstance(self.node, Text):
             return "inline"
@@ -122,45 +161,84 @@ class BlockLayout(AbstractLayout):
         self.width = self.parent.width
         self.rtl = self.parent.rtl
 
-        mode = self.layout_mode()
-        if mode == "block":
-            previous = None
-            for child in self.node.children:
-                if isinstance(child, Element) and child.tag == "head":
-                    continue
-                next = BlockLayout(child, self, previous)
-                self.children.append(next)
-                previous = next
-        else:
-
-            # Ex. 5-3: Indent text for bulleted list items
-            if isinstance(self.parent.node, Element) and self.parent.node.tag in [
-                "ul",
-                "ol",
-            ]:
-                self.cursor_x += 8
+        if self.mode is None:
+            self.mode = self.layout_mode()
+            if self.mode == "block":
+                previous = None
+                for child in self.node.children:
+                    if isinstance(child, Element) and child.tag == "head":
+                        continue
+                    next = BlockLayout(child, self, previous)
+                    self.children.append(next)
+                    previous = next
 
-            self.recurse(self.node)
-            self.flush()
+        if self.mode == "inline" and self.line_width != self.width:
+            self.layout_inline()
 
         for child in self.children:
             child.layout()
 
-        if mode == "block":
+        if self.mode == "block":
             self.height = sum([child.height for child in self.children])
         else:
             self.height = self.cursor_y
 
+    def layout_inline(self):
+        node = self.node
+        key = (id(node), id(node.style), self.width, self.rtl)
+        entry = LAYOUT_CACHE.get(key)
+        if (
+            entry is not None
+            and entry.node() is node
+            and entry.version == node.version
+            and entry.style is node.style
+            and entry.font_backend is fonts.font_backend
+        ):
+            self.display_list = entry.display_list
+            self.cursor_y = entry.height
+            self.line_width = self.width
+            return
+
+        self.display_list = []
+        self.line = []
+        self.cursor_x = 0
+        self.cursor_y = 0
+        self.in_abbr_tag = False
+        self.in_pre_tag = False
+        self.in_sup_tag = False
+
+        # Ex. 5-3: Indent text for bulleted list items
+        if isinstance(self.parent.node, Element) and self.parent.node.tag in [
+            "ul",
+            "ol",
+        ]:
+            self.cursor_x += 8
+
+        self.recurse(self.node)
+        self.flush()
+        self.line_width = self.width
+
+        LAYOUT_CACHE.add(
+            key,
+            LayoutEntry(
+                node=weakref.ref(node),
+                version=node.version,
+                style=node.style,
+                font_backend=fonts.font_backend,
+                display_list=self.display_list,
+                height=self.cursor_y,
+            ),
+        )
+
     def recurse(self, tree: Node):
         if isinstance(tree, Text):
             # Ex. 3-5
             if self.in_pre_tag:
                 # Split on newline to preserve internal whitespace
-                for line in tree.text.split("\n"):
+                for line in tree.pre_lines():
                     self._handle_pre(tree, line)
             else:
-                for word in tree.text.split():
-                    self.word(tree, word)
+                self.word_run(tree, tree.words())
         elif isinstance(tree, Element):
             self.open_tag(tree.tag)
             for child in tree.children:
@@ -173,52 +251,54 @@ class BlockLayout(AbstractLayout):
         # Inside an <abbr> tag, lower-case letters should be small, capitalized, and bold,
         abbr_font = get_font(size, "bold", "roman")
         # while all other characters (upper case, numbers, etc.) should be drawn in the normal font
-        curr_font = get_font(size, node.style["font-weight"], node.style["font-style"])
+        curr_font = get_font(size, node.style.font_weight, node.style.font_style)
 
         # If the <abbr> word won't fit on the current line, flush first
-        word_w = curr_font.measure(word)
+        word_w = measure(curr_font, word)
         if self.cursor_x + word_w > self.width - HSTEP:
             self.flush()
 
         # Measure and append individual characters since they may vary
         for char in word:
             if char.isupper() or char.isnumeric():
-                char_w = curr_font.measure(char)
+                char_w = measure(curr_font, char)
                 self.line.append(
                     LineItem(
                         x=self.cursor_x,
                         word=char,
+                        width=char_w,
+                        source=id(node),
                         font=curr_font,
-                        color=node.style.get("color", "black"),
+                        color=node.style.color,
                         valign="top" if self.in_sup_tag else "baseline",
                     )
                 )
             else:
-                char_w = abbr_font.measure(char)
+                char_w = measure(abbr_font, char)
                 self.line.append(
                     LineItem(
                         x=self.cursor_x,
                         word=char.upper(),
+                        # Drawn upper case, which may not take up the space measured
+                        width=measure(abbr_font, char.upper()),
+                        source=id(node),
                         font=abbr_font,
-                        color=node.style.get("color", "black"),
+                        color=node.style.color,
                         valign="top" if self.in_sup_tag else "baseline",
                     )
                 )
 
             self.cursor_x += char_w
 
-        self.cursor_x += curr_font.measure(" ")
+        self.cursor_x += space_width(curr_font)
 
     # Ex. 3-5
-    def _handle_pre(self, node: Text, line: str):
+    def _handle_pre(self, node: Text, line: PreLine | None):
         font = get_font_from_node(node)
-        if len(line):
-            words = line.split(" ")
-            for word in words:
-                if len(word):
-                    self.word(node, word)
-                else:
-                    self.cursor_x += font.measure(" ")
+        if line is not None:
+            words, gaps, trailing_gap = line
+            self.word_run(node, words, gaps)
+            self.cursor_x += trailing_gap * space_width(font)
 
             self.flush()
         else:
@@ -227,13 +307,69 @@ class BlockLayout(AbstractLayout):
             self.cursor_y += VSTEP
             self.cursor_x = 0
 
+    # Lays out a run of words in the same font, breaking lines exactly like calling
+    # `word` on each of them. `gaps` counts extra spaces before each word.
+    def word_run(
+        self, node: Text, words: Sequence[str], gaps: Sequence[int] | None = None
+    ):
+        if self.in_abbr_tag:
+            space = space_width(get_font_from_node(node))
+            for i, word in enumerate(words):
+                if gaps:
+                    self.cursor_x += gaps[i] * space
+                self.word(node, word)
+            return
+
+        font = get_font_from_node(node)
+        widths = measure_words(font, words)
+        space = space_width(font)
+        color = node.style.color
+        valign = node.style.get("vertical-align", "baseline")
+
+        # Where each word would start and end if the whole run fit on one line. Both
+        # only grow, so the first word that overflows can be found by bisection.
+        if gaps:
+            advances = [gap * space + w + space for gap, w in zip(gaps, widths)]
+            starts = list(accumulate(advances, initial=0))
+            lefts = [start + gap * space for start, gap in zip(starts, gaps)]
+        else:
+            starts = list(accumulate([w + space for w in widths], initial=0))
+            lefts = starts
+        rights = [left + w for left, w in zip(lefts, widths)]
+
+        limit = self.width - HSTEP
+        i = 0
+        while i < len(words):
+            offset = self.cursor_x - starts[i]
+            overflow = bisect_right(rights, limit - offset, lo=i)
+            self.line.extend(
+                LineItem(
+                    x=lefts[j] + offset,
+                    word=words[j],
+                    width=widths[j],
+                    source=id(node),
+                    font=font,
+                    color=color,
+                    valign=valign,
+                )
+                for j in range(i, overflow)
+            )
+            if overflow == len(words):
+                self.cursor_x = starts[overflow] + offset
+                return
+
+            # The overflowing word wraps or splits at soft hyphens one at a time
+            self.cursor_x = lefts[overflow] + offset
+            self.word(node, words[overflow])
+            i = overflow + 1
+
     def word(self, node: Text, word: str):
         if self.in_abbr_tag:
             self._handle_abbr(node, word)
             return
 
         font = get_font_from_node(node)
-        w = font.measure(word)
+        w = measure(font, word)
 
         if self.cursor_x + w > self.width - HSTEP:
             if "&shy;" in word:
@@ -247,28 +383,36 @@ class BlockLayout(AbstractLayout):
             LineItem(
                 x=self.cursor_x,
                 word=word,
+                width=w,
+                source=id(node),
                 font=font,
-                color=node.style["color"],
+                color=node.style.color,
                 valign=node.style.get("vertical-align", "baseline"),
             )
         )
-        self.cursor_x += w + font.measure(" ")
+        self.cursor_x += w + space_width(font)
 
     def flush(self):
         if not self.line:
             return
 
-        metrics = [item.font.metrics() for item in self.line]
-        max_ascent = max([metric["ascent"] for metric in metrics])
+        metrics = [get_metrics(item.font) for item in self.line]
+        max_ascent = max([metric.ascent for metric in metrics])
         baseline = self.cursor_y + 1.25 * max_ascent
 
-        for item in self.line:
-            x = self.x + item.x
-            y = self.y + baseline - item.font.metrics("ascent")
+        # Words of the same text one space apart are joined into runs using the widths
+        # they were laid out with, and each run is then measured once as a whole
+        runs: list[tuple[DisplayListItem, list[LineItem]]] = []
+        run: DisplayListItem | None = None
+        words: list[LineItem] = []
+        previous: LineItem | None = None
+        for item, metric in zip(self.line, metrics):
+            x = item.x
+            y = baseline - metric.ascent
 
             # Ex. 3-2
             if item.valign == "top":
-                y = self.y + baseline - max_ascent
+                y = baseline - max_ascent
 
             # Ex. 2-7
             if self.text_align == "right":
@@ -279,18 +423,54 @@ class BlockLayout(AbstractLayout):
                 x_offset = (self.width - self.cursor_x) / 2
                 x += x_offset
 
-            self.display_list.append(
-                DisplayListItem(
+            if (
+                run is not None
+                and previous is not None
+                and previous.source == item.source
+                and run.font is item.font
+                and run.y == y
+                and previous.x + previous.width + space_width(item.font) == item.x
+            ):
+                run.word += " " + item.word
+                run.width = x + item.width - run.x
+                words.append(item)
+            else:
+                run = DisplayListItem(
                     x=x,
                     y=y,
                     word=item.word,
+                    width=item.width,
+                    source=item.source,
                     font=item.font,
                     color=item.color,
                     valign=item.valign,
                 )
-            )
+                words = [item]
+                runs.append((run, words))
+            previous = item
+
+        for run, words in runs:
+            # A run is only drawn as one item if the font draws it exactly as wide as
+            # it was laid out, so kerning or rounding can't move any of its words
+            if len(words) == 1 or measure(run.font, run.word) == run.width:
+                self.display_list.append(run)
+                continue
+            offset = run.x - words[0].x
+            for item in words:
+                self.display_list.append(
+                    DisplayListItem(
+                        x=item.x + offset,
+                        y=run.y,
+                        word=item.word,
+                        width=item.width,
+                        source=item.source,
+                        font=item.font,
+                        color=item.color,
+                        valign=item.valign,
+                    )
+                )
 
-        max_descent = max([metric["descent"] for metric in metrics])
+        max_descent = max([metric.descent for metric in metrics])
         self.cursor_y = baseline + 1.25 * max_descent
         self.cursor_x = 0
         self.line = []
@@ -322,25 +502,15 @@ class BlockLayout(AbstractLayout):
     def paint(self):
         cmds: list[DrawRect | DrawText] = []
 
-        if self.is_matching_element("pre"):
-            cmds.append(
-                DrawRect(
-                    left=self.x,
-                    top=self.y,
-                    right=self.x + self.width,
-                    bottom=self.y + self.height,
-                    color="gray",
-                )
-            )
-
-        if self.is_matching_element("nav") and self.has_css_class("links"):
+        bgcolor = self.node.style.get("background-color", "transparent")
+        if bgcolor != "transparent":
             cmds.append(
                 DrawRect(
                     left=self.x,
                     top=self.y,
                     right=self.x + self.width,
                     bottom=self.y + self.height,
-                    color="lightgray",
+                    color=bgcolor,
                 )
             )
 
@@ -348,7 +518,7 @@ class BlockLayout(AbstractLayout):
         if self.is_matching_element("li"):
             BULLET_SIZE = 4
             line_height = (
-                self.display_list[0].font.metrics()["linespace"]
+                get_metrics(self.display_list[0].font).linespace
                 if len(self.display_list)
                 else self.cursor_y
             )
@@ -363,12 +533,12 @@ class BlockLayout(AbstractLayout):
                 )
             )
 
-        if self.layout_mode() == "inline":
+        if self.mode == "inline":
             for item in self.display_list:
                 cmds.append(
                     DrawText(
-                        left=item.x,
-                        top=item.y,
+                        left=self.x + item.x,
+                        top=self.y + item.y,
                         text=item.word,
                         font=item.font,
                         color=item.color,
@@ -0,0 +1,58 @@
+import codecs
+from io import BufferedReader
+from typing import Iterator
+import zlib
+
+# The readers below fill a single preallocated buffer and yield views into it, so a
+# yielded view is only valid until the next one is requested
+
+
+def read_exactly(
+    response: BufferedReader, length: int, buffer: memoryview
+) -> Iterator[memoryview]:
+    while length > 0:
+        n = response.readinto(buffer[: min(length, len(buffer))])
+        if not n:
+            raise ConnectionError(f"Connection closed with {length} bytes left")
+        length -= n
+        yield buffer[:n]
+
+
+def read_until_eof(
+    response: BufferedReader, buffer: memoryview
+) -> Iterator[memoryview]:
+    while n := response.readinto(buffer):
+        yield buffer[:n]
+
+
+# Ex. 1-9
+def read_chunks(response: BufferedReader, buffer: memoryview) -> Iterator[memoryview]:
+    while True:
+        line = response.readline()
+        chunk_size = int(line, 16)  # Size is first line, represented in hex
+
+        # Final chunk always has length of 0, followed by optional trailers
+        if chunk_size == 0:
+            while response.readline() not in [b"\r\n", b""]:
+                pass
+            return
+
+        yield from read_exactly(response, chunk_size, buffer)
+        # Each chunk ends in `/r/n`, which needs to be read
+        response.read(2)
+
+
+class BodyDecoder:
+    def __init__(self, gzip: bool = False):
+        # wbits offset by 16 makes zlib expect a gzip header and trailer
+        self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzip else None
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def decode(self, data: bytes | memoryview) -> str:
+        if self.decompressor:
+            data = self.decompressor.decompress(data)
+        return self.decoder.decode(data)
+
+    def flush(self) -> str:
+        data = self.decompressor.flush() if self.decompressor else b""
+        return self.decoder.decode(data, final=True)
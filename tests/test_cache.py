@@ -1,7 +1,7 @@
 import time
 import unittest
 
-from cache import browser_cache
+from cache import LRUCache, browser_cache
 
 
 url = "https://browser.engineering/examples"
@@ -24,3 +24,16 @@ class TestBrowserCache(unittest.TestCase):
         time.sleep(2)
         self.assertEqual(browser_cache.has(url), False)
         self.assertEqual(browser_cache.get(url), None)
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.add("a", 1)
+        cache.add("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.add("c", 3)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats(), {"hits": 3, "misses": 1, "size": 2})
@@ -0,0 +1,158 @@
+import unittest
+from unittest.mock import patch
+
+from connection_pool import ConnectionPool, connection_pool
+from tests.utils import socket
+from url import HttpURL
+
+
+class FakeSocket:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    def test_reuse_released_connection(self):
+        pool = ConnectionPool()
+        key = ("http", "browser.engineering", 80)
+        conn = pool.acquire(key, FakeSocket)
+        pool.release(conn)
+
+        reused = pool.acquire(key, FakeSocket)
+        self.assertIs(reused, conn)
+        self.assertTrue(reused.reused)
+        self.assertEqual(pool.stats()["hits"], 1)
+        self.assertEqual(pool.stats()["misses"], 1)
+
+    def test_pool_per_host(self):
+        pool = ConnectionPool()
+        conn = pool.acquire(("http", "browser.engineering", 80), FakeSocket)
+        pool.release(conn)
+
+        other = pool.acquire(("https", "browser.engineering", 443), FakeSocket)
+        self.assertIsNot(other, conn)
+        self.assertEqual(pool.stats()["misses"], 2)
+
+    def test_discarded_connection_is_closed(self):
+        pool = ConnectionPool()
+        conn = pool.acquire(("http", "browser.engineering", 80), FakeSocket)
+        pool.discard(conn)
+        self.assertTrue(conn.sock.closed)
+        self.assertEqual(pool.stats()["idle"], 0)
+        self.assertEqual(pool.stats()["active"], 0)
+
+    def test_idle_timeout(self):
+        pool = ConnectionPool(idle_timeout=10)
+        key = ("http", "browser.engineering", 80)
+        with patch("connection_pool.monotonic", return_value=100):
+            conn = pool.acquire(key, FakeSocket)
+            pool.release(conn)
+
+        with patch("connection_pool.monotonic", return_value=111):
+            fresh = pool.acquire(key, FakeSocket)
+        self.assertIsNot(fresh, conn)
+        self.assertTrue(conn.sock.closed)
+
+    def test_idle_timeout_for_other_hosts(self):
+        pool = ConnectionPool(idle_timeout=10)
+        a = ("http", "a.example", 80)
+        b = ("http", "b.example", 80)
+        with patch("connection_pool.monotonic", return_value=0):
+            conn = pool.acquire(a, FakeSocket)
+            pool.release(conn)
+
+        with patch("connection_pool.monotonic", return_value=1000):
+            pool.release(pool.acquire(b, FakeSocket))
+        self.assertTrue(conn.sock.closed)
+        self.assertEqual(pool.stats()["idle"], 1)
+        self.assertNotIn(a, pool._idle)
+
+    def test_max_connections_per_host(self):
+        pool = ConnectionPool(max_per_host=1)
+        key = ("http", "browser.engineering", 80)
+        conn = pool.acquire(key, FakeSocket)
+
+        with patch.object(pool._lock, "wait", side_effect=TimeoutError):
+            with self.assertRaises(TimeoutError):
+                pool.acquire(key, FakeSocket)
+
+        pool.release(conn)
+        self.assertIs(pool.acquire(key, FakeSocket), conn)
+
+    def test_acquire_timeout(self):
+        pool = ConnectionPool(max_per_host=1, acquire_timeout=0.01)
+        key = ("http", "browser.engineering", 80)
+        conn = pool.acquire(key, FakeSocket)
+
+        # The only connection is never released
+        with self.assertRaises(TimeoutError):
+            pool.acquire(key, FakeSocket)
+        self.assertEqual(pool.stats()["active"], 1)
+
+        pool.release(conn)
+        self.assertIs(pool.acquire(key, FakeSocket), conn)
+
+
+class TestKeepAlive(unittest.TestCase):
+    def setUp(self):
+        connection_pool.clear()
+        socket.patch().start()
+
+    def tearDown(self):
+        connection_pool.clear()
+
+    def test_reuse_keep_alive_connection(self):
+        url = "http://browser.engineering/keep-alive.html"
+        socket.respond(
+            url,
+            b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nfirst"
+            + b"HTTP/1.1 200 OK\r\nContent-Length: 6\r\n\r\nsecond",
+        )
+        self.assertEqual(HttpURL(url).request()[0], "first")
+        self.assertEqual(HttpURL(url).request()[0], "second")
+        self.assertEqual(connection_pool.stats()["hits"], 1)
+        self.assertEqual(connection_pool.stats()["misses"], 1)
+
+    def test_reuse_after_chunked_response(self):
+        url = "http://browser.engineering/chunked.html"
+        socket.respond(
+            url,
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            + b"3\r\nabc\r\n2\r\nde\r\n0\r\n\r\n"
+            + b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nfg",
+        )
+        self.assertEqual(HttpURL(url).request()[0], "abcde")
+        self.assertEqual(HttpURL(url).request()[0], "fg")
+        self.assertEqual(connection_pool.stats()["hits"], 1)
+
+    def test_connection_close_is_not_pooled(self):
+        url = "http://browser.engineering/close.html"
+        socket.respond(
+            url,
+            b"HTTP/1.1 200 OK\r\nConnection: close\r\nContent-Length: 4\r\n\r\nbody",
+        )
+        self.assertEqual(HttpURL(url).request()[0], "body")
+        self.assertEqual(connection_pool.stats()["idle"], 0)
+
+    def test_unframed_body_is_not_pooled(self):
+        url = "http://browser.engineering/unframed.html"
+        socket.respond(url, b"HTTP/1.1 200 OK\r\n\r\nbody")
+        self.assertEqual(HttpURL(url).request()[0], "body")
+        self.assertEqual(connection_pool.stats()["idle"], 0)
+
+    def test_retry_on_closed_idle_connection(self):
+        url = "http://browser.engineering/stale.html"
+        socket.respond(url, b"HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\nbody")
+        self.assertEqual(HttpURL(url).request()[0], "body")
+
+        # The pooled socket has nothing left to read, like one closed by the server
+        self.assertEqual(HttpURL(url).request()[0], "body")
+        self.assertEqual(connection_pool.stats()["hits"], 1)
+        self.assertEqual(connection_pool.stats()["misses"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
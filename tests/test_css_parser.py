@@ -1,8 +1,30 @@
+import os
+import shutil
+import tempfile
 from typing import cast
 import unittest
+from unittest import mock
 
-from css.parser import CSSParser
-from css.selectors import DescendantSelector, TagSelector
+from css.parser import (
+    COMPILED_STYLESHEET,
+    DEFAULT_STYLESHEET,
+    CSSParser,
+    get_default_stylesheet,
+    inline_style_cache,
+    load_stylesheet,
+    parse_inline_style,
+    parse_stylesheet,
+    stylesheet_cache,
+)
+from css.selectors import (
+    ClassSelector,
+    CompoundSelector,
+    DescendantSelector,
+    IdSelector,
+    TagSelector,
+    cascade_priority,
+    merge_rules,
+)
 
 
 class TestCSSParser(unittest.TestCase):
@@ -41,6 +63,28 @@ class TestCSSParser(unittest.TestCase):
         rules = parser.parse_declaration_block()
         self.assertEqual(len(rules.keys()), 0)
 
+    def test_parse_inline_style_with_newlines_in_value(self):
+        styles = "margin:\n  0\n  auto ;COLOR: Red;"
+        parser = CSSParser(text=styles)
+        rules = parser.parse_declaration_block()
+        self.assertEqual(rules, {"margin": "0 auto", "color": "Red"})
+
+    def test_recover_from_invalid_declaration(self):
+        styles = "p { color: rgb(0, 0, 0); font-size: 90%; } a { color: red }"
+        parser = CSSParser(text=styles)
+        (p, p_body), (a, a_body) = parser.parse()
+        self.assertEqual(p_body, {"font-size": "90%"})
+        # A declaration without a semicolon is dropped, but the rule is kept
+        self.assertEqual(cast(TagSelector, a).tag, "a")
+        self.assertEqual(a_body, {})
+
+    def test_recover_from_invalid_selector(self):
+        styles = "a > b { color: red; } i { font-style: italic; }"
+        parser = CSSParser(text=styles)
+        ((selector, body),) = parser.parse()
+        self.assertEqual(cast(TagSelector, selector).tag, "i")
+        self.assertEqual(body, {"font-style": "italic"})
+
     def test_parse_stylesheet(self):
         styles = 'body { font-family: "Courier New"; }'
         parser = CSSParser(text=styles)
@@ -69,7 +113,28 @@ class TestCSSParser(unittest.TestCase):
         with open("browser.css", "r") as file:
             parser = CSSParser(text=file.read())
             selector_rules = parser.parse()
-            self.assertEqual(len(selector_rules), 8)
+            self.assertEqual(len(selector_rules), 9)
+
+    def test_parse_class_and_id_selectors(self):
+        styles = ".Note { color: red; } #Main { color: blue; } NAV.links p { x: y; }"
+        parser = CSSParser(text=styles)
+        (note, _), (main, _), (nav_p, _) = parser.parse()
+        # Class names and ids are case sensitive, unlike tags
+        self.assertEqual(cast(ClassSelector, note).name, "Note")
+        self.assertEqual(cast(IdSelector, main).name, "Main")
+
+        nav_links = cast(DescendantSelector, nav_p).ancestor
+        self.assertIsInstance(nav_links, CompoundSelector)
+        tag, links = cast(CompoundSelector, nav_links).parts
+        self.assertEqual(cast(TagSelector, tag).tag, "nav")
+        self.assertEqual(cast(ClassSelector, links).name, "links")
+        self.assertEqual([note.priority, main.priority, nav_p.priority], [10, 100, 12])
+
+    def test_parse_invalid_compound_selector(self):
+        styles = "p..note { color: red; } p. { color: red; } i { color: blue; }"
+        parser = CSSParser(text=styles)
+        ((selector, _),) = parser.parse()
+        self.assertEqual(cast(TagSelector, selector).tag, "i")
 
     def test_parse_descendant_selector(self):
         styles = "h1 a { color: red; }"
@@ -85,3 +150,105 @@ class TestCSSParser(unittest.TestCase):
         descendant = cast(DescendantSelector, selector).descendant
         self.assertEqual(cast(TagSelector, ancestor).tag, "h1")
         self.assertEqual(cast(TagSelector, descendant).tag, "a")
+
+
+class TestDefaultStylesheet(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, "browser.css")
+        self.compiled_path = os.path.join(self.dir, "__pycache__", "browser.css.pickle")
+        self.write("div p { color: red; } p { color: blue; }")
+
+    def write(self, text: str):
+        with open(self.path, "w") as file:
+            file.write(text)
+
+    def test_parsed_once(self):
+        stylesheet = get_default_stylesheet()
+        self.assertIs(get_default_stylesheet(), stylesheet)
+        self.assertEqual(list(stylesheet), sorted(stylesheet, key=cascade_priority))
+        _, body = stylesheet[0]
+        with self.assertRaises(TypeError):
+            body["color"] = "red"  # type: ignore
+
+    def test_compiled_stylesheet(self):
+        rules = load_stylesheet(self.path, self.compiled_path)
+        self.assertTrue(os.path.exists(self.compiled_path))
+        self.assertEqual([body["color"] for _, body in rules], ["blue", "red"])
+
+        with mock.patch("css.parser.CSSParser") as parser:
+            rules = load_stylesheet(self.path, self.compiled_path)
+            parser.assert_not_called()
+        self.assertEqual([body["color"] for _, body in rules], ["blue", "red"])
+
+    def test_compiled_stylesheet_is_invalidated(self):
+        load_stylesheet(self.path, self.compiled_path)
+        self.write("a { color: green; } b { color: green; } i { color: green; }")
+        rules = load_stylesheet(self.path, self.compiled_path)
+        self.assertEqual([body["color"] for _, body in rules], ["green"] * 3)
+
+    def test_corrupt_compiled_stylesheet(self):
+        os.makedirs(os.path.dirname(self.compiled_path))
+        with open(self.compiled_path, "wb") as file:
+            file.write(b"not a pickle")
+        rules = load_stylesheet(self.path, self.compiled_path)
+        self.assertEqual(len(rules), 2)
+
+    def test_compiled_by_other_code(self):
+        load_stylesheet(self.path, self.compiled_path)
+        with mock.patch("css.parser.compiler_version", return_value="other"):
+            with mock.patch("css.parser.CSSParser", wraps=CSSParser) as parser:
+                rules = load_stylesheet(self.path, self.compiled_path)
+                parser.assert_called_once()
+        self.assertEqual(len(rules), 2)
+
+    def test_compiled_classes_missing(self):
+        os.makedirs(os.path.dirname(self.compiled_path))
+        # A pickle of a selector class that no longer exists
+        with open(self.compiled_path, "wb") as file:
+            file.write(b"ccss.selectors\nRemovedSelector\n.")
+        rules = load_stylesheet(self.path, self.compiled_path)
+        self.assertEqual(len(rules), 2)
+
+    def test_default_paths_are_absolute(self):
+        self.assertTrue(os.path.isabs(DEFAULT_STYLESHEET))
+        self.assertEqual(
+            os.path.dirname(os.path.dirname(COMPILED_STYLESHEET)),
+            os.path.dirname(DEFAULT_STYLESHEET),
+        )
+
+    def test_merge_rules(self):
+        defaults = get_default_stylesheet()
+        author_rules = CSSParser(
+            "nav a { color: red; } a { color: green; } b { font-weight: normal; }"
+        ).parse()
+        self.assertEqual(
+            merge_rules(defaults, author_rules),
+            sorted(list(defaults) + author_rules, key=cascade_priority),
+        )
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        inline_style_cache.clear()
+        stylesheet_cache.clear()
+
+    def test_inline_style_is_parsed_once(self):
+        first = parse_inline_style("color: red; font-size: 90%;")
+        second = parse_inline_style("color: red; font-size: 90%;")
+        self.assertIs(first, second)
+        self.assertEqual(dict(first), {"color": "red", "font-size": "90%"})
+        self.assertEqual(
+            inline_style_cache.stats(), {"hits": 1, "misses": 1, "size": 1}
+        )
+        with self.assertRaises(TypeError):
+            first["color"] = "blue"  # type: ignore
+
+    def test_stylesheet_is_parsed_once(self):
+        text = "p { color: red; } div a { color: blue; }"
+        rules = parse_stylesheet(text)
+        self.assertIs(parse_stylesheet(text), rules)
+        self.assertIsNot(parse_stylesheet(text + " "), rules)
+        self.assertEqual([body["color"] for _, body in rules], ["red", "blue"])
+        self.assertEqual(stylesheet_cache.stats(), {"hits": 1, "misses": 2, "size": 2})
@@ -0,0 +1,64 @@
+import unittest
+
+from layout.fonts import (
+    MEASUREMENTS,
+    METRICS,
+    SPACE_WIDTHS,
+    FontMetrics,
+    get_metrics,
+    measure,
+    measure_words,
+    space_width,
+)
+
+
+class FakeFont:
+    def __init__(self, name: str, char_width: int):
+        self.name = name
+        self.char_width = char_width
+        self.calls = 0
+
+    def measure(self, text: str) -> int:
+        self.calls += 1
+        return self.char_width * len(text)
+
+    def metrics(self) -> dict[str, int]:
+        self.calls += 1
+        return {"ascent": 12, "descent": 4, "linespace": 16, "fixed": 0}
+
+
+class TestMeasure(unittest.TestCase):
+    def setUp(self):
+        MEASUREMENTS.clear()
+        SPACE_WIDTHS.clear()
+        METRICS.clear()
+
+    def test_measurements_are_cached_per_font(self):
+        small, large = FakeFont("small", 5), FakeFont("large", 10)
+        for _ in range(3):
+            self.assertEqual(measure(small, "abc"), 15)  # type: ignore
+            self.assertEqual(measure(large, "abc"), 30)  # type: ignore
+        self.assertEqual((small.calls, large.calls), (1, 1))
+        self.assertEqual(MEASUREMENTS.stats(), {"hits": 4, "misses": 2, "size": 2})
+
+    def test_measure_words(self):
+        font = FakeFont("font", 5)
+        measure(font, "a")  # type: ignore
+        widths = measure_words(font, ["a", "bb", "a", "ccc"])  # type: ignore
+        self.assertEqual(widths, [5, 10, 5, 15])
+        self.assertEqual(font.calls, 3)
+        self.assertEqual(measure(font, "ccc"), 15)  # type: ignore
+        self.assertEqual(font.calls, 3)
+
+    def test_space_width(self):
+        font = FakeFont("font", 7)
+        self.assertEqual(space_width(font), 7)  # type: ignore
+        self.assertEqual(space_width(font), 7)  # type: ignore
+        self.assertEqual(font.calls, 1)
+
+    def test_metrics(self):
+        font = FakeFont("font", 7)
+        metrics = get_metrics(font)  # type: ignore
+        self.assertEqual(metrics, FontMetrics(ascent=12, descent=4, linespace=16))
+        self.assertIs(get_metrics(font), metrics)  # type: ignore
+        self.assertEqual(font.calls, 1)
@@ -0,0 +1,395 @@
+import gc
+from typing import Sequence
+import unittest
+from unittest import mock
+import weakref
+
+from browser import Browser
+from constants import HSTEP, RESIZE_THROTTLE_MS, VSTEP, WIDTH
+from css.computed import StyleCache
+from css.parser import get_default_stylesheet, restyle, style
+from css.rule_index import RuleIndex
+from layout.commands import DrawRect, DrawText
+from layout.font_backends import HeadlessFont, HeadlessFontBackend, TkFontBackend
+from layout.fonts import get_font, get_font_from_node, set_font_backend, space_width
+from layout.layout import LAYOUT_CACHE, BlockLayout, DocumentLayout, paint_tree
+from url import URL
+from utils import tree_to_list
+from web_html.node import Element, Text
+from web_html.parser import HTMLParser
+
+PARAGRAPHS = (
+    "<h1>Title</h1>" + "<p>lorem ipsum dolor sit amet</p><ul><li>a b</li></ul>" * 10
+)
+
+
+def style_document(html: str) -> Element:
+    root = HTMLParser(html).parse()
+    style(root, RuleIndex(list(get_default_stylesheet())))
+    return root
+
+
+def paint_document(document: DocumentLayout) -> list[DrawRect | DrawText]:
+    display_list: list[DrawRect | DrawText] = []
+    paint_tree(document, display_list)
+    return display_list
+
+
+def layout_document(html: str, rtl: bool = False, width: int = WIDTH):
+    document = DocumentLayout(style_document(html), width=width, rtl=rtl)
+    document.layout()
+    return paint_document(document)
+
+
+def texts(display_list: list[DrawRect | DrawText]) -> list[DrawText]:
+    return [cmd for cmd in display_list if isinstance(cmd, DrawText)]
+
+
+# Lays out with the headless fonts, so these tests run without a display
+class HeadlessTestCase(unittest.TestCase):
+    def setUp(self):
+        set_font_backend(HeadlessFontBackend())
+        self.addCleanup(set_font_backend, TkFontBackend())
+
+
+class TestHeadlessFont(HeadlessTestCase):
+    def test_measure(self):
+        # 12pt is 16px, so a 1000 unit em is 16px wide
+        font = get_font(12, "normal", "roman")
+        self.assertIsInstance(font, HeadlessFont)
+        self.assertEqual(
+            font.measure("abc"), round(556 * 16 / 1000) * 2 + round(500 * 16 / 1000)
+        )
+        self.assertEqual(font.measure("ab c"), font.measure("ab") + font.measure(" c"))
+        self.assertGreater(get_font(12, "bold", "roman").measure("abc"), 26)
+        self.assertEqual(font.measure("é"), round(556 * 16 / 1000))
+        self.assertEqual(
+            font.metrics(), {"ascent": 14, "descent": 3, "linespace": 17, "fixed": 0}
+        )
+
+    def test_family_fallback(self):
+        courier = get_font(12, "normal", "roman", "Courier New")
+        self.assertEqual(courier["family"], "Courier New")
+        self.assertEqual(courier.measure("il"), courier.measure("WM"))
+        self.assertEqual(courier.metrics("fixed"), 1)
+
+        unknown = get_font(12, "normal", "roman", "Comic Sans")
+        self.assertEqual(
+            unknown.measure("abc"), get_font(12, "normal", "roman").measure("abc")
+        )
+
+
+class TestHeadlessLayout(HeadlessTestCase):
+    def test_load(self):
+        # Words on the same line in the same style are drawn as one run
+        (run,) = layout_document("abc def")
+        assert isinstance(run, DrawText)
+        self.assertEqual(run.text, "abc def")
+        self.assertEqual(run.left, HSTEP)
+
+    def test_rtl(self):
+        (run,) = layout_document("abc def", rtl=True)
+        self.assertGreater(run.left, HSTEP)
+
+    def test_line_wrapping(self):
+        display_list = texts(layout_document("lorem ipsum " * 100, width=300))
+        lines = sorted({cmd.top for cmd in display_list})
+        self.assertGreater(len(lines), 1)
+        for cmd in display_list:
+            self.assertLessEqual(cmd.left + cmd.font.measure(cmd.text), 300)
+
+    def test_superscript(self):
+        abc, defg = texts(layout_document("<div>abc <sup>def</sup></div>"))
+        self.assertEqual(abc.top, defg.top)
+
+    def test_abbr(self):
+        display_list = texts(layout_document("<abbr>Hello World 123</abbr>"))
+        self.assertEqual(len(display_list), 13)
+        for char in display_list:
+            if char.text.isalpha():
+                self.assertTrue(char.text.isupper())
+
+    def test_pre(self):
+        rect, abc, d, ef = layout_document("<pre>abc\n\n<b>d  ef</b></pre>")
+        self.assertIsInstance(rect, DrawRect)
+        assert isinstance(abc, DrawText) and isinstance(d, DrawText)
+        assert isinstance(ef, DrawText)
+        self.assertEqual(abc.font["family"], "Courier New")
+        self.assertEqual(d.font["weight"], "bold")
+        self.assertGreaterEqual(d.top - abc.top, VSTEP * 2)
+        self.assertGreaterEqual(ef.left - d.left, d.font.measure(" ") * 2)
+
+    def test_nav(self):
+        rect, link = layout_document("<nav class='links'><p>link</p></nav>")
+        assert isinstance(rect, DrawRect) and isinstance(link, DrawText)
+        self.assertEqual(rect.color, "lightgray")
+        self.assertEqual(link.text, "link")
+
+    def test_runs(self):
+        display_list = texts(
+            layout_document("<p>a b <b>c d</b> e <span style='color:red;'>f</span></p>")
+        )
+        self.assertEqual([cmd.text for cmd in display_list], ["a b", "c d", "e", "f"])
+
+        # Every word still starts where it was laid out
+        a_b, c_d, *_ = display_list
+        space = a_b.font.measure(" ")
+        self.assertEqual(
+            c_d.left,
+            a_b.left + a_b.font.measure("a") + space * 2 + a_b.font.measure("b"),
+        )
+
+    def test_one_run_per_line(self):
+        display_list = texts(layout_document("<p>" + "lorem ipsum " * 100 + "</p>"))
+        lines = {cmd.top for cmd in display_list}
+        self.assertEqual(len(display_list), len(lines))
+        self.assertEqual(sum(len(cmd.text.split()) for cmd in display_list), 200)
+
+    def test_runs_are_as_wide_as_laid_out(self):
+        document = DocumentLayout(style_document(PARAGRAPHS * 3 + "lorem ipsum " * 50))
+        document.layout()
+        runs = []
+        blocks = [document.children[0]]
+        while blocks:
+            block = blocks.pop()
+            blocks.extend(block.children)
+            runs.extend(item for item in block.display_list if " " in item.word)
+        self.assertGreater(len(runs), 0)
+        for run in runs:
+            self.assertEqual(run.font.measure(run.word), run.width)
+
+    def test_runs_measured_differently_are_split(self):
+        html = "<p>lorem ipsum <b>dolor sit</b> amet</p>"
+        # Like a font that kerns across spaces, so no run is as wide as its words
+        measure = HeadlessFont.measure
+        with mock.patch.object(
+            HeadlessFont,
+            "measure",
+            autospec=True,
+            side_effect=lambda font, text: measure(font, text) + (" " in text.strip()),
+        ):
+            display_list = texts(layout_document(html))
+        self.assertEqual(
+            [cmd.text for cmd in display_list],
+            ["lorem", "ipsum", "dolor", "sit", "amet"],
+        )
+
+        # The words are still where they were laid out
+        set_font_backend(HeadlessFontBackend())
+        LAYOUT_CACHE.clear()
+        lorem_ipsum, dolor_sit, amet = texts(layout_document(html))
+        self.assertEqual(
+            [cmd.left for cmd in display_list[::2]],
+            [lorem_ipsum.left, dolor_sit.left, amet.left],
+        )
+
+    def test_deterministic(self):
+        html = "<p>Some <b>bold</b> and <i>italic</i> text</p>" * 20
+        first = [(cmd.left, cmd.top) for cmd in texts(layout_document(html))]
+        set_font_backend(HeadlessFontBackend())
+        second = [(cmd.left, cmd.top) for cmd in texts(layout_document(html))]
+        self.assertEqual(first, second)
+
+
+class TestRelayout(HeadlessTestCase):
+    def setUp(self):
+        super().setUp()
+        self.document = DocumentLayout(style_document(PARAGRAPHS))
+        self.document.layout()
+
+    def count_inline_layouts(self):
+        return mock.patch.object(
+            BlockLayout,
+            "layout_inline",
+            autospec=True,
+            side_effect=BlockLayout.layout_inline,
+        )
+
+    def test_same_width_reuses_lines(self):
+        before = paint_document(self.document)
+        with self.count_inline_layouts() as layout_inline:
+            self.document.layout()
+        layout_inline.assert_not_called()
+        self.assertEqual(paint_document(self.document), before)
+
+    def test_new_width_matches_fresh_layout(self):
+        for width in [120, 300, WIDTH]:
+            self.document.width = width
+            with self.count_inline_layouts() as layout_inline:
+                self.document.layout()
+            self.assertGreater(layout_inline.call_count, 0)
+            self.assertEqual(
+                paint_document(self.document), layout_document(PARAGRAPHS, width=width)
+            )
+
+
+def word_at_a_time(
+    self: BlockLayout,
+    node: Text,
+    words: Sequence[str],
+    gaps: Sequence[int] | None = None,
+):
+    space = space_width(get_font_from_node(node))
+    for i, word in enumerate(words):
+        if gaps:
+            self.cursor_x += gaps[i] * space
+        self.word(node, word)
+
+
+class TestLineBreaking(HeadlessTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(LAYOUT_CACHE.clear)
+
+    def assertMatchesWordAtATime(self, html: str):
+        for width in [60, 150, 333.5, WIDTH]:
+            for rtl in [False, True]:
+                LAYOUT_CACHE.clear()
+                batched = layout_document(html, rtl=rtl, width=width)
+                LAYOUT_CACHE.clear()
+                with mock.patch.object(BlockLayout, "word_run", word_at_a_time):
+                    expected = layout_document(html, rtl=rtl, width=width)
+                self.assertEqual(batched, expected, (width, rtl))
+
+    def test_paragraph(self):
+        self.assertMatchesWordAtATime(
+            "<p>lorem ipsum <b>dolor sit</b> amet " * 20 + "</p>"
+        )
+
+    def test_soft_hyphens(self):
+        words = ["in&shy;com&shy;pre&shy;hen&shy;si&shy;ble", "a", "x&shy;y"] * 10
+        self.assertMatchesWordAtATime(f"<ul><li>{' '.join(words)}</li></ul>")
+
+    def test_pre(self):
+        self.assertMatchesWordAtATime(
+            "<pre>a  b   lorem ipsum\n\n  dolor   sit amet  </pre>" * 5
+        )
+
+    def test_abbr(self):
+        self.assertMatchesWordAtATime("<abbr>Hello World 123 </abbr>" * 10)
+
+
+class TestLayoutCache(HeadlessTestCase):
+    def setUp(self):
+        super().setUp()
+        LAYOUT_CACHE.clear()
+        self.rules = RuleIndex(list(get_default_stylesheet()))
+        self.cache = StyleCache()
+        self.root = HTMLParser(PARAGRAPHS).parse()
+        style(self.root, self.rules, cache=self.cache)
+
+    def layout(self, width: float = WIDTH, rtl: bool = False):
+        document = DocumentLayout(self.root, width=width, rtl=rtl)
+        document.layout()
+        return paint_document(document)
+
+    def count_recurse_calls(self):
+        return mock.patch.object(
+            BlockLayout, "recurse", autospec=True, side_effect=BlockLayout.recurse
+        )
+
+    def test_repeated_layout(self):
+        expected = self.layout()
+        misses = LAYOUT_CACHE.misses
+        with self.count_recurse_calls() as recurse:
+            self.assertEqual(self.layout(), expected)
+        recurse.assert_not_called()
+        self.assertEqual(LAYOUT_CACHE.misses, misses)
+        self.assertEqual(LAYOUT_CACHE.hits, misses)
+
+    def test_width_and_direction_are_part_of_the_key(self):
+        wide, narrow, rtl = self.layout(), self.layout(width=120), self.layout(rtl=True)
+        self.assertNotEqual(wide, narrow)
+        self.assertNotEqual(wide, rtl)
+        with self.count_recurse_calls() as recurse:
+            self.assertEqual(self.layout(width=120), narrow)
+            self.assertEqual(self.layout(rtl=True), rtl)
+        recurse.assert_not_called()
+
+    def test_changes_invalidate_their_block(self):
+        self.layout()
+        first_p = self.root.children[0].children[1]
+        assert isinstance(first_p, Element) and first_p.tag == "p"
+        first_p.set_attribute("style", "font-size: 200%;")
+        restyle(self.root, self.rules, self.cache)
+        with self.count_recurse_calls() as recurse:
+            self.layout()
+        self.assertEqual(recurse.call_args_list[0].args[1], first_p)
+
+        text = first_p.children[0]
+        assert isinstance(text, Text)
+        text.set_text("changed")
+        with self.count_recurse_calls() as recurse:
+            display_list = self.layout()
+        self.assertEqual(recurse.call_args_list[0].args[1], first_p)
+        self.assertIn("changed", [cmd.text for cmd in texts(display_list)])
+
+    def test_changed_node_replaces_its_entry(self):
+        self.layout()
+        size = len(LAYOUT_CACHE)
+        text = self.root.children[0].children[1].children[0]
+        assert isinstance(text, Text)
+        text.set_text("changed")
+        self.layout()
+        self.assertEqual(len(LAYOUT_CACHE), size)
+
+    def test_pages_are_not_kept_alive(self):
+        nodes = []
+        for _ in range(5):
+            root = style_document(PARAGRAPHS)
+            DocumentLayout(root).layout()
+            nodes.extend(weakref.ref(node) for node in tree_to_list(root, []))
+            del root
+        gc.collect()
+        self.assertGreater(len(LAYOUT_CACHE), 0)
+        self.assertEqual([ref for ref in nodes if ref() is not None], [])
+
+
+@mock.patch("browser.tkinter")
+class TestResize(HeadlessTestCase):
+    def resize(self, browser: Browser, width: int, height: int):
+        browser.resize(mock.Mock(width=width, height=height))
+
+    def test_resize_events_are_coalesced(self, tkinter):
+        browser = Browser()
+        browser.nodes = style_document(PARAGRAPHS)
+        browser.layout()
+        document = browser.document
+
+        for width in range(400, 600, 10):
+            self.resize(browser, width, 500)
+        browser.window.after.assert_called_once_with(
+            RESIZE_THROTTLE_MS, browser.apply_resize
+        )
+
+        with mock.patch.object(browser, "relayout") as relayout:
+            browser.apply_resize()
+        relayout.assert_called_once_with()
+        self.assertEqual((browser.screen_width, browser.screen_height), (590, 500))
+        self.assertIs(browser.document, document)
+
+        # The next event schedules another relayout
+        self.resize(browser, 300, 500)
+        self.assertEqual(browser.window.after.call_count, 2)
+
+    def test_load_clears_layout_cache(self, tkinter):
+        browser = Browser()
+        browser.load(URL.create("data:text/html,<p>abc</p>"))
+        self.assertEqual(len(LAYOUT_CACHE), 1)
+        browser.load(URL.create("data:text/html,<p>def</p><p>ghi</p>"))
+        self.assertEqual(len(LAYOUT_CACHE), 2)
+
+    def test_height_only_resize(self, tkinter):
+        browser = Browser()
+        browser.nodes = style_document(PARAGRAPHS)
+        browser.layout()
+
+        self.resize(browser, browser.screen_width, 300)
+        with mock.patch.object(browser, "relayout") as relayout:
+            browser.apply_resize()
+        relayout.assert_not_called()
+        self.assertEqual(browser.screen_height, 300)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import unittest
+
+from web_html.node import Element, Node, Text
+from web_html.parser import HTMLParser
+
+DOCUMENT = """<!doctype html>
+<html>
+<head><title>Example</title><link rel="stylesheet" href="/main.css"></head>
+<body>
+<nav class='links'><a href="/">Home</a> <a href="/about">About</a></nav>
+<p>Some <b>bold</b> and <i>italic</i> text<br>after a break</p>
+<pre>line one
+  line two</pre>
+</body>
+</html>"""
+
+
+def to_tuple(node: Node):
+    if isinstance(node, Text):
+        return node.text
+    return (
+        node.tag,
+        node.attributes,
+        [to_tuple(child) for child in node.children],
+    )
+
+
+class TestHTMLParser(unittest.TestCase):
+    def test_parse(self):
+        root = HTMLParser("<p>abc <b>def</b></p>").parse()
+        self.assertEqual(
+            to_tuple(root),
+            ("html", {}, [("body", {}, [("p", {}, ["abc ", ("b", {}, ["def"])])])]),
+        )
+
+    def test_implicit_head(self):
+        root = HTMLParser("<title>abc</title><p>def</p>").parse()
+        self.assertEqual(
+            to_tuple(root),
+            (
+                "html",
+                {},
+                [
+                    ("head", {}, [("title", {}, ["abc"])]),
+                    ("body", {}, [("p", {}, ["def"])]),
+                ],
+            ),
+        )
+
+    def test_insertion_mode(self):
+        parser = HTMLParser()
+        self.assertEqual(parser.mode, "initial")
+        parser.feed("<html>")
+        self.assertEqual(parser.mode, "before-head")
+        parser.feed("<title>")
+        self.assertEqual(parser.mode, "in-head")
+        parser.feed("abc</title><p>")
+        self.assertEqual(parser.mode, "in-body")
+
+    def test_deep_nesting(self):
+        depth = 2000
+        root = HTMLParser("<div>" * depth + "abc" + "</div>" * depth).parse()
+        node = root.children[0]
+        for _ in range(depth + 1):
+            node = node.children[0]
+        self.assertEqual(to_tuple(node), "abc")
+
+    def test_parent_pointers(self):
+        root = HTMLParser("<div><p>abc</p></div>").parse()
+        body = root.children[0]
+        div = body.children[0]
+        p = div.children[0]
+        self.assertIs(body.parent, root)
+        self.assertIs(div.parent, body)
+        self.assertIs(p.parent, div)
+        self.assertIs(p.children[0].parent, p)
+
+    def test_compact_nodes(self):
+        root = HTMLParser("<p class=a>abc</p><p class=b>def</p>").parse()
+        first, second = root.children[0].children
+        self.assertFalse(hasattr(first, "__dict__"))
+        self.assertIs(first.tag, second.tag)
+
+        first_key = next(iter(first.attributes))
+        second_key = next(iter(second.attributes))
+        self.assertIs(first_key, second_key)
+
+        abc, defg = first.children[0], second.children[0]
+        self.assertFalse(hasattr(abc, "__dict__"))
+        self.assertIs(abc.children, defg.children)
+
+    def test_feed_matches_parse(self):
+        expected = to_tuple(HTMLParser(DOCUMENT).parse())
+        for size in [1, 2, 3, 7, 64]:
+            parser = HTMLParser()
+            for i in range(0, len(DOCUMENT), size):
+                parser.feed(DOCUMENT[i : i + size])
+            self.assertEqual(to_tuple(parser.close()), expected, size)
+
+    def test_partial_tree(self):
+        parser = HTMLParser()
+        parser.feed("<body><p>first</p><p>sec")
+        assert parser.root is not None
+        body = parser.root.children[0]
+        self.assertEqual(len(body.children), 2)
+        self.assertEqual(to_tuple(body.children[0]), ("p", {}, ["first"]))
+
+        # Text is held back until we know it's complete
+        self.assertEqual(body.children[1].children, [])
+
+        parser.feed("ond</p>")
+        root = parser.close()
+        self.assertIs(root, parser.root)
+        self.assertEqual(to_tuple(body.children[1]), ("p", {}, ["second"]))
+
+    def test_tag_split_across_chunks(self):
+        parser = HTMLParser()
+        parser.feed("<a hr")
+        parser.feed('ef="/x">link</')
+        parser.feed("a>")
+        root = parser.close()
+        link = root.children[0].children[0]
+        assert isinstance(link, Element)
+        self.assertEqual(link.tag, "a")
+        self.assertEqual(link.attributes, {"href": "/x"})
+
+    def test_quoted_attributes(self):
+        root = HTMLParser(
+            '<p class="note wide" id=\'x\' style="color: red;" hidden>a</p>'
+        ).parse()
+        p = root.children[0].children[0]
+        assert isinstance(p, Element)
+        self.assertEqual(
+            p.attributes,
+            {"class": "note wide", "id": "x", "style": "color: red;", "hidden": ""},
+        )
+        self.assertEqual(p.classes, ("note", "wide"))
+
+
+class TestText(unittest.TestCase):
+    def test_words_are_split_once(self):
+        text = Text("  lorem\tipsum \n dolor ", Element("p", {}, None))
+        words = text.words()
+        self.assertEqual(words, ("lorem", "ipsum", "dolor"))
+        self.assertIs(text.words(), words)
+
+        text.set_text("sit amet")
+        self.assertEqual(text.words(), ("sit", "amet"))
+
+    def test_pre_lines(self):
+        text = Text("a  b \n\n  c", Element("pre", {}, None))
+        self.assertEqual(
+            text.pre_lines(),
+            ((("a", "b"), (0, 1), 1), None, (("c",), (2,), 0)),
+        )
+        self.assertIs(text.pre_lines(), text.pre_lines())
+
+
+if __name__ == "__main__":
+    unittest.main()
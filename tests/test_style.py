@@ -0,0 +1,269 @@
+import unittest
+
+from css.computed import StyleCache
+from css.parser import CSSParser, restyle, style
+from css.rule_index import RuleIndex
+from css.selectors import AncestorFilter, cascade_priority
+from utils import tree_to_list
+from web_html.node import Element, Node, Text
+from web_html.parser import HTMLParser
+
+
+def style_document(
+    html: str, css: str, cache: StyleCache | None = None
+) -> tuple[Element, RuleIndex]:
+    root = HTMLParser(html).parse()
+    rules = RuleIndex(sorted(CSSParser(css).parse(), key=cascade_priority))
+    style(root, rules, cache=cache)
+    return root, rules
+
+
+def find(root: Element, tag: str) -> list[Node]:
+    return [
+        node
+        for node in tree_to_list(root, [])
+        if isinstance(node, Element) and node.tag == tag
+    ]
+
+
+class TestStyle(unittest.TestCase):
+    def test_tag_rule(self):
+        root, _ = style_document("<p>abc</p>", "p { color: red; }")
+        (p,) = find(root, "p")
+        self.assertEqual(p.style["color"], "red")
+        # Text nodes inherit from their parent
+        self.assertEqual(p.children[0].style["color"], "red")
+
+    def test_cascade_order(self):
+        css = "div p { color: green; } p { color: red; } p { color: blue; }"
+        root, _ = style_document("<div><p>abc</p></div><p>def</p>", css)
+        inside, outside = find(root, "p")
+        self.assertEqual(inside.style["color"], "green")
+        self.assertEqual(outside.style["color"], "blue")
+
+    def test_multi_level_descendant(self):
+        html = "<div><p><span>a</span></p></div><p><div><span>b</span></div></p>"
+        root, _ = style_document(html, "div p span { color: red; }")
+        in_order, out_of_order = find(root, "span")
+        self.assertEqual(in_order.style["color"], "red")
+        self.assertEqual(out_of_order.style["color"], "black")
+
+    def test_ancestor_filter(self):
+        selector, _ = CSSParser("nav ul a { color: red; }").parse()[0]
+        (a,) = find(HTMLParser("<ul><li><a>x</a></li></ul>").parse(), "a")
+
+        ancestors = AncestorFilter()
+        for tag in ["html", "body", "ul", "li"]:
+            ancestors.push(Element(tag, {}, None))
+        self.assertFalse(selector.matches(a, ancestors))
+
+        ancestors.push(Element("nav", {}, None))
+        self.assertTrue(ancestors.contains_all(frozenset(["nav", "ul"])))
+
+    def test_inline_style_wins(self):
+        root, _ = style_document(
+            "<p style='color:yellow;'>abc</p>", "p { color: red; }"
+        )
+        (p,) = find(root, "p")
+        self.assertEqual(p.style["color"], "yellow")
+
+    def test_percentage_font_size(self):
+        root, _ = style_document("<div><p>abc</p></div>", "p { font-size: 50%; }")
+        (p,) = find(root, "p")
+        self.assertEqual(p.style["font-size"], "8.0px")
+
+    def test_typed_values(self):
+        root, _ = style_document(
+            "<div><p>abc</p></div>",
+            "div { font-size: 24px; font-weight: bold; } p { font-size: 50%; }",
+        )
+        (div,) = find(root, "div")
+        (p,) = find(root, "p")
+        self.assertEqual(div.style.font_size_px, 24.0)
+        self.assertEqual(div.style.font_size, 18)
+        self.assertEqual(p.style.font_size_px, 12.0)
+        self.assertEqual(p.children[0].style.font_size, 9)
+        self.assertEqual(p.style.font_weight, "bold")
+        # Unsupported values fall back to ones Tk understands
+        self.assertEqual(p.style.font_style, "roman")
+        self.assertEqual(p.style.color, "black")
+
+    def test_index_only_examines_candidate_rules(self):
+        css = "a { color: blue; } li { color: red; } div li { color: green; }"
+        _, rules = style_document("<ul><li>a</li><li>b</li></ul>", css)
+        # Only the two rules whose subject is li are tried, for each of the two items
+        self.assertEqual(rules.stats(), {"examined": 4, "matched": 2})
+
+    def test_class_and_id_selectors(self):
+        html = "<p class='note'>a</p><p id='main' class='note'>b</p><p>c</p>"
+        css = "#main { color: red; } .note { color: blue; } p { color: green; }"
+        root, _ = style_document(html, css)
+        first, second, third = find(root, "p")
+        # Ids beat classes, which beat tags, wherever they appear in the stylesheet
+        self.assertEqual(first.style["color"], "blue")
+        self.assertEqual(second.style["color"], "red")
+        self.assertEqual(third.style["color"], "green")
+
+    def test_compound_selector(self):
+        html = (
+            "<nav class='links'><a>a</a></nav><nav><a>b</a></nav><p class='links'>c</p>"
+        )
+        css = "nav.links a { color: red; } nav.links { font-weight: bold; }"
+        root, _ = style_document(html, css)
+        first, second = find(root, "nav")
+        self.assertEqual(first.style["font-weight"], "bold")
+        self.assertEqual(second.style["font-weight"], "normal")
+        (p,) = find(root, "p")
+        self.assertEqual(p.style["font-weight"], "normal")
+
+        in_links, outside = find(root, "a")
+        self.assertEqual(in_links.style["color"], "red")
+        self.assertEqual(outside.style["color"], "black")
+
+    def test_class_rules_are_bucketed(self):
+        css = " ".join(f".c{i} {{ color: red; }}" for i in range(1000))
+        _, rules = style_document("<p class=c5>a</p><p class=c7>b</p><p>c</p>", css)
+        self.assertEqual(rules.stats(), {"examined": 2, "matched": 2})
+
+    def test_multiple_classes_from_markup(self):
+        html = "<p class='note big'>a</p><p class=\"big\">b</p>"
+        css = ".note { color: red; } .big { font-weight: bold; }"
+        root, _ = style_document(html, css)
+        first, second = find(root, "p")
+        self.assertEqual(first.style["color"], "red")
+        self.assertEqual(first.style["font-weight"], "bold")
+        self.assertEqual(second.style["color"], "black")
+        self.assertEqual(second.style["font-weight"], "bold")
+
+    def test_repeated_class_matches_once(self):
+        _, rules = style_document("<p class='a a'>x</p>", ".a { color: red; }")
+        self.assertEqual(rules.stats(), {"examined": 1, "matched": 1})
+
+    def test_share_sibling_styles(self):
+        cache = StyleCache()
+        root, _ = style_document(
+            "<ul><li>a</li><li>b</li><li style='color:red;'>c</li></ul>",
+            "li { color: blue; }",
+            cache,
+        )
+        first, second, third = find(root, "li")
+        self.assertIs(first.style, second.style)
+        self.assertIsNot(first.style, third.style)
+        self.assertEqual(third.style["color"], "red")
+        self.assertIs(first.children[0].style, second.children[0].style)
+        self.assertGreater(cache.stats()["hits"], 0)
+
+    def test_share_cousin_styles(self):
+        root, _ = style_document(
+            "<div><p>a</p></div><div><p>b</p></div>", "p { color: blue; }"
+        )
+        first, second = find(root, "p")
+        self.assertIs(first.style, second.style)
+
+    def test_no_sharing_across_descendant_rules(self):
+        root, _ = style_document(
+            "<nav><a>a</a></nav><footer><a>b</a></footer>", "nav a { color: red; }"
+        )
+        (nav,) = find(root, "nav")
+        (footer,) = find(root, "footer")
+        self.assertIs(nav.style, footer.style)
+
+        in_nav, in_footer = find(root, "a")
+        self.assertEqual(in_nav.style["color"], "red")
+        self.assertEqual(in_footer.style["color"], "black")
+
+    def test_computed_style_is_read_only(self):
+        root, _ = style_document("<p>abc</p>", "")
+        (p,) = find(root, "p")
+        with self.assertRaises(TypeError):
+            p.style["color"] = "red"
+
+
+class TestRestyle(unittest.TestCase):
+    def setUp(self):
+        self.cache = StyleCache()
+        self.root, self.rules = style_document(
+            "<div><p>a</p><p>b</p></div><div><p>c</p></div>",
+            "p { color: blue; }",
+            self.cache,
+        )
+        self.first_div, self.second_div = find(self.root, "div")
+
+    def test_clean_tree_is_skipped(self):
+        lookups = self.cache.hits + self.cache.misses
+        restyle(self.root, self.rules, self.cache)
+        self.assertEqual(self.cache.hits + self.cache.misses, lookups)
+
+    def test_inline_style_change(self):
+        p = self.first_div.children[0]
+        other_p = self.second_div.children[0]
+        other_style = other_p.style
+
+        assert isinstance(p, Element)
+        p.set_attribute("style", "color: red;")
+        self.assertTrue(p.style_dirty)
+        self.assertTrue(self.root.child_dirty)
+
+        lookups = self.cache.hits + self.cache.misses
+        restyle(self.root, self.rules, self.cache)
+        self.assertEqual(p.style["color"], "red")
+        self.assertEqual(p.children[0].style["color"], "red")
+        self.assertIs(other_p.style, other_style)
+        # Only the changed node and its text child were looked at
+        self.assertEqual(self.cache.hits + self.cache.misses - lookups, 2)
+        self.assertFalse(p.style_dirty or self.root.child_dirty)
+
+    def test_inherited_change_reaches_descendants(self):
+        self.first_div.set_attribute("style", "font-size: 200%;")
+        restyle(self.root, self.rules, self.cache)
+        for p in self.first_div.children:
+            self.assertEqual(p.style["font-size"], "32.0px")
+            self.assertEqual(p.children[0].style["font-size"], "32.0px")
+        self.assertEqual(self.second_div.children[0].style["font-size"], "16px")
+
+    def test_non_inherited_change_stops_at_node(self):
+        p = self.first_div.children[0]
+        text_style = p.children[0].style
+        assert isinstance(p, Element)
+        p.set_attribute("style", "background-color: red;")
+        restyle(self.root, self.rules, self.cache)
+        self.assertEqual(p.style["background-color"], "red")
+        self.assertIs(p.children[0].style, text_style)
+
+    def test_class_change_restyles_descendants(self):
+        rules = RuleIndex(
+            sorted(CSSParser(".dark p { color: white; }").parse(), key=cascade_priority)
+        )
+        style(self.root, rules, cache=self.cache)
+        self.first_div.set_attribute("class", "wide dark")
+        self.assertEqual(self.first_div.classes, ("wide", "dark"))
+
+        restyle(self.root, rules, self.cache)
+        for p in self.first_div.children:
+            self.assertEqual(p.style["color"], "white")
+        self.assertEqual(self.second_div.children[0].style["color"], "black")
+
+    def test_inserted_subtree(self):
+        p = Element("p", {}, None)
+        p.append_child(Text("d", p))
+        self.second_div.append_child(p)
+        restyle(self.root, self.rules, self.cache)
+        self.assertEqual(p.style["color"], "blue")
+        self.assertEqual(p.children[0].style["color"], "blue")
+
+    def test_removed_child_is_detached(self):
+        p = self.first_div.children[0]
+        self.first_div.remove_child(p)
+        self.assertIsNone(p.parent)
+
+        version = self.root.version
+        text = p.children[0]
+        assert isinstance(text, Text)
+        text.set_text("changed")
+        p.set_attribute("style", "color: red;")
+        self.assertEqual(self.root.version, version)
+        self.assertFalse(self.root.child_dirty)
+
+
+if __name__ == "__main__":
+    unittest.main()
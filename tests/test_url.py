@@ -1,8 +1,9 @@
+import gzip
 import unittest
 from unittest.mock import mock_open, patch
 
-from url import URL, DataURL, FileURL, HttpURL
-from tests.utils import socket, ssl
+from url import URL, DataURL, FileURL, HttpURL, request_all, request_all_async
+from tests.utils import run_async, socket, ssl, streams
 
 
 class TestURL(unittest.TestCase):
@@ -80,6 +81,119 @@ class TestURL(unittest.TestCase):
         body, _ = HttpURL(orig_url).request()
         assert body == "Body text"
 
+    def test_request_all_preserves_order(self):
+        socket.patch().start()
+        urls = []
+        for i in range(8):
+            url = f"http://browser.engineering/style{i}.css"
+            socket.respond(url, b"HTTP/1.0 200 OK\r\n\r\n" + bytes(str(i), "utf-8"))
+            urls.append(HttpURL(url))
+
+        bodies = request_all(urls, max_workers=4)
+        self.assertEqual(bodies, [str(i) for i in range(8)])
+
+    def test_request_all_isolates_failures(self):
+        socket.patch().start()
+        ok_url = "http://browser.engineering/ok.css"
+        socket.respond(ok_url, b"HTTP/1.0 200 OK\r\n\r\nok")
+        missing_url = "http://browser.engineering/missing.css"
+
+        bodies = request_all([HttpURL(missing_url), HttpURL(ok_url)], max_workers=2)
+        self.assertEqual(bodies, [None, "ok"])
+
+    def test_stream_chunked_gzip(self):
+        socket.patch().start()
+        url = "http://browser.engineering/examples/stream.html"
+        text = " ".join(f"déjà {i * 7919 % 10007}" for i in range(2000))
+        compressed = gzip.compress(text.encode("utf-8"))
+        chunks = [compressed[i : i + 100] for i in range(0, len(compressed), 100)]
+        response = b"HTTP/1.1 200 OK\r\n"
+        response += b"Content-Encoding: gzip\r\nTransfer-Encoding: chunked\r\n\r\n"
+        for chunk in chunks:
+            response += bytes(hex(len(chunk))[2:], "ascii") + b"\r\n" + chunk + b"\r\n"
+        response += b"0\r\n\r\n"
+        socket.respond(url, response)
+
+        pieces = list(HttpURL(url).stream(chunk_size=64))
+        self.assertGreater(len(pieces), 1)
+        self.assertEqual("".join(pieces), text)
+
+    def test_stream_splits_multibyte_characters(self):
+        socket.patch().start()
+        url = "http://browser.engineering/examples/stream-utf8.html"
+        body = "ééé".encode("utf-8")
+        socket.respond(
+            url,
+            b"HTTP/1.1 200 OK\r\nContent-Length: "
+            + bytes(str(len(body)), "ascii")
+            + b"\r\n\r\n"
+            + body,
+        )
+
+        # A 3-byte buffer always ends in the middle of a 2-byte character
+        pieces = list(HttpURL(url).stream(chunk_size=3))
+        self.assertEqual("".join(pieces), "ééé")
+        self.assertTrue(all(pieces))
+
+    def test_stream_non_http_url(self):
+        url = DataURL("data:text/html,Hello world!")
+        self.assertEqual(list(url.stream()), ["Hello world!"])
+
+    def test_request_async(self):
+        streams.patch().start()
+        url = "https://browser.engineering/examples/async.html"
+        socket.respond(url, b"HTTP/1.1 200 OK\r\nContent-Length: 9\r\n\r\nBody text")
+        body, _ = run_async(HttpURL(url).request_async())
+        self.assertEqual(body, "Body text")
+
+    def test_request_async_chunked_gzip(self):
+        streams.patch().start()
+        url = "http://browser.engineering/examples/async-gzip.html"
+        compressed = gzip.compress(b"Body text")
+        socket.respond(
+            url,
+            b"HTTP/1.1 200 OK\r\n"
+            + b"Content-Encoding: gzip\r\n"
+            + b"Transfer-Encoding: chunked\r\n\r\n"
+            + bytes(hex(4)[2:], "ascii")
+            + b"\r\n"
+            + compressed[:4]
+            + b"\r\n"
+            + bytes(hex(len(compressed) - 4)[2:], "ascii")
+            + b"\r\n"
+            + compressed[4:]
+            + b"\r\n0\r\n\r\n",
+        )
+        body, _ = run_async(HttpURL(url).request_async())
+        self.assertEqual(body, "Body text")
+
+    def test_request_async_redirect(self):
+        streams.patch().start()
+        orig_url = "http://browser.engineering/async-redirect"
+        socket.respond(
+            orig_url,
+            b"HTTP/1.1 301 Moved permanently\r\n"
+            + b"Location: /async-target.html\r\n\r\n",
+        )
+        socket.respond(
+            "http://browser.engineering/async-target.html",
+            b"HTTP/1.0 200 OK\r\n\r\nBody text",
+        )
+        body, _ = run_async(HttpURL(orig_url).request_async())
+        self.assertEqual(body, "Body text")
+
+    def test_request_all_async(self):
+        streams.patch().start()
+        urls: list = [DataURL("data:text/html,first")]
+        for i in range(20):
+            url = f"http://browser.engineering/async{i}.css"
+            socket.respond(url, b"HTTP/1.0 200 OK\r\n\r\n" + bytes(str(i), "utf-8"))
+            urls.append(HttpURL(url))
+        urls.append(HttpURL("http://browser.engineering/async-missing.css"))
+
+        bodies = run_async(request_all_async(urls, max_in_flight=5))
+        self.assertEqual(bodies, ["first"] + [str(i) for i in range(20)] + [None])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,8 +1,12 @@
+import asyncio
 import io
+import socket as socket_module
 from unittest import mock
 
 # Test helpers borrowed from https://github.com/browserengineering/book/blob/main/src/test.py
 
+REAL_SOCKET = socket_module.socket
+
 
 class socket:
     URLs = {}
@@ -107,3 +111,56 @@ class ssl:
     @classmethod
     def patch(cls):
         return mock.patch("ssl.create_default_context", wraps=cls)
+
+
+class StreamWriter:
+    def __init__(self, reader, scheme, host, port):
+        self.reader = reader
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.request = b""
+        self.closed = False
+
+    # Responses are served from the same registry as the socket mock above
+    def write(self, data):
+        self.request += data
+        if b"\r\n\r\n" not in self.request:
+            return
+
+        method, path, _ = self.request.decode("latin1").split(" ", 2)
+        if (self.scheme, self.port) in [("http", 80), ("https", 443)]:
+            url = self.scheme + "://" + self.host + path
+        else:
+            url = self.scheme + "://" + self.host + ":" + str(self.port) + path
+        socket.Requests.setdefault(url, []).append(self.request)
+        assert method == socket.URLs[url][0]
+
+        self.reader.feed_data(socket.URLs[url][1])
+        self.reader.feed_eof()
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def run_async(coro):
+    # Socket mocks started by other tests may still be active, but the event loop
+    # needs a real socket pair for its self-pipe
+    with mock.patch("socket.socket", REAL_SOCKET):
+        return asyncio.run(coro)
+
+
+class streams:
+    @staticmethod
+    async def open_connection(host, port, ssl=None, server_hostname=None):
+        if ssl:
+            assert host == server_hostname
+        reader = asyncio.StreamReader()
+        return reader, StreamWriter(reader, "https" if ssl else "http", host, port)
+
+    @classmethod
+    def patch(cls):
+        return mock.patch("asyncio.open_connection", new=cls.open_connection)
@@ -1,13 +1,18 @@
 from abc import ABC, abstractmethod
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import gzip
 from io import BufferedReader
 import socket
 import ssl
-from typing import Self
+from typing import Iterator, Self
 from urllib.parse import urlparse
 
 from cache import browser_cache
+from constants import MAX_ASYNC_REQUESTS, MAX_PARALLEL_REQUESTS, STREAM_CHUNK_SIZE
+from connection_pool import PooledConnection, connection_pool
 from headers import make_headers, parse_cache_control_header
+from streaming import BodyDecoder, read_chunks, read_exactly, read_until_eof
 
 
 class AbstractURL(ABC):
@@ -23,6 +28,15 @@ class AbstractURL(ABC):
     def resolve(self, url: str) -> Self:
         pass
 
+    # Non-network URLs are cheap to load, so the whole body is a single piece
+    def stream(self) -> Iterator[str]:
+        body, _ = self.request()
+        yield body
+
+    # Likewise, they just run the blocking path
+    async def request_async(self) -> tuple[str, bool]:
+        return await asyncio.to_thread(self.request)
+
 
 class URL:
     @staticmethod
@@ -114,11 +128,11 @@ class HttpURL(AbstractURL):
 
         return s
 
-    def _build_request(self) -> str:
+    def _build_request(self, connection: str = "keep-alive") -> str:
         headers = make_headers(
             {
                 "Accept-Encoding": "gzip",
-                "Connection": "close",
+                "Connection": connection,
                 "Host": self.host,
                 "User-Agent": "python-browser",
             }
@@ -126,41 +140,78 @@ class HttpURL(AbstractURL):
         request = f"GET {self.path} HTTP/1.1\r\n{headers}\r\n"
         return request
 
+    def _parse_header_line(self, line: str, response_headers: dict[str, str]):
+        header, value = line.split(":", 1)
+        # Headers are case-insensitive, whitespace doesn't matter
+        response_headers[header.lower()] = value.strip()
+
     def _parse_response_headers(self, response: BufferedReader):
         response_headers = {}
         while True:
             line = response.readline().decode("utf-8")
             if line == "\r\n":
                 break
-            header, value = line.split(":", 1)
-            # Headers are case-insensitive, whitespace doesn't matter
-            response_headers[header.lower()] = value.strip()
+            self._parse_header_line(line, response_headers)
         return response_headers
 
-    # Ex. 1-7
-    def _handle_redirect(self, location: str | None):
-        if location is not None:
-            if location.startswith("/"):
-                self.path = location
-            else:
-                self._parse_url(location)
-            return self.request()
+    def _redirect_to(self, location: str):
+        if location.startswith("/"):
+            self.path = location
+        else:
+            self._parse_url(location)
+
+    def _read_body(
+        self,
+        response: BufferedReader,
+        status: str,
+        response_headers: dict[str, str],
+        buffer: memoryview,
+    ) -> Iterator[memoryview]:
+        if status in ["204", "304"] or status.startswith("1"):
+            return iter([])
+        if response_headers.get("transfer-encoding") == "chunked":
+            return read_chunks(response, buffer)
+        if "content-length" in response_headers:
+            length = int(response_headers["content-length"])
+            return read_exactly(response, length, buffer)
+
+        # Without any framing, the body only ends when the server closes the connection
+        return read_until_eof(response, buffer)
+
+    def _can_reuse(
+        self, version: str, status: str, response_headers: dict[str, str]
+    ) -> bool:
+        framed = (
+            status in ["204", "304"]
+            or status.startswith("1")
+            or response_headers.get("transfer-encoding") == "chunked"
+            or "content-length" in response_headers
+        )
+        connection = response_headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            return framed and connection != "close"
+        return framed and connection == "keep-alive"
 
-    # Ex. 1-9
-    def _read_chunks(self, response: BufferedReader):
-        content = b""
+    def _open(self) -> tuple[PooledConnection, str, str, dict[str, str]]:
+        key = (self.scheme, self.host, self.port)
         while True:
-            line = response.readline()
-            chunk_size = int(line, 16)  # Size is first line, represented in hex
-
-            # Final chunk always has length of 0
-            if chunk_size == 0:
-                break
-            content += response.read(chunk_size)
-            # Each chunk ends in `/r/n`, which needs to be read
-            response.read(2)
-
-        return content
+            conn = connection_pool.acquire(key, self._connect)
+            try:
+                request = self._build_request()
+                conn.sock.send(request.encode("utf8"))
+
+                # Read out response parts; status line is first line
+                statusline = conn.reader.readline().decode("utf-8")
+                version, status, explanation = statusline.split(" ", 2)
+                response_headers = self._parse_response_headers(conn.reader)
+                return conn, version, status, response_headers
+            except Exception as e:
+                connection_pool.discard(conn)
+                # The server may have closed an idle connection in the meantime, in
+                # which case we retry; a fresh connection is eventually used
+                if conn.reused and isinstance(e, (OSError, ValueError)):
+                    continue
+                raise
 
     # Ex. 1-8
     def _cache_response(self, cache_control: str | None, content: str):
@@ -170,6 +221,21 @@ class HttpURL(AbstractURL):
         if should_cache:
             browser_cache.add(self.url, content, int(max_age))
 
+    def _decode_response(
+        self, status: str, response_headers: dict[str, str], content_bytes: bytes
+    ) -> str:
+        # Handle decompression; chunking is already handled while reading the body
+        if response_headers.get("content-encoding") == "gzip":
+            content_bytes = gzip.decompress(content_bytes)
+        content = content_bytes.decode("utf-8")
+
+        # Handle caching results for GET 200 requests
+        if status == "200":
+            cache_control = response_headers.get("cache-control")
+            self._cache_response(cache_control, content)
+
+        return content
+
     def resolve(self, url: str) -> "HttpURL":
         if "://" in url:
             return HttpURL(url)
@@ -187,6 +253,57 @@ class HttpURL(AbstractURL):
         else:
             return HttpURL(self.scheme + "://" + self.host + ":" + str(self.port) + url)
 
+    def stream(self, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+        if browser_cache.has(self.url):
+            body = browser_cache.get(self.url)
+            if body:
+                yield body
+                return
+
+        conn, version, status, response_headers = self._open()
+        location = response_headers.get("location")
+        is_redirect = status.startswith("3") and location is not None
+
+        # Only hold on to the whole body if it's going to be cached
+        cache_control = response_headers.get("cache-control")
+        parts: list[str] | None = [] if status == "200" and cache_control else None
+
+        buffer = memoryview(bytearray(chunk_size))
+        decoder = BodyDecoder(response_headers.get("content-encoding") == "gzip")
+        finished = False
+        try:
+            for data in self._read_body(conn.reader, status, response_headers, buffer):
+                # Redirect bodies are drained so the connection can be reused
+                if is_redirect:
+                    continue
+                text = decoder.decode(data)
+                if text:
+                    if parts is not None:
+                        parts.append(text)
+                    yield text
+
+            text = "" if is_redirect else decoder.flush()
+            finished = True
+        finally:
+            if finished and self._can_reuse(version, status, response_headers):
+                connection_pool.release(conn)
+            else:
+                connection_pool.discard(conn)
+
+        # Ex. 1-7
+        if is_redirect and location is not None:
+            self._redirect_to(location)
+            yield from self.stream(chunk_size)
+            return
+
+        if text:
+            if parts is not None:
+                parts.append(text)
+            yield text
+
+        if parts is not None:
+            self._cache_response(cache_control, "".join(parts))
+
     def request(self) -> tuple[str, bool]:
         # Check cache for this URL first and return content immediately if found
         if browser_cache.has(self.url):
@@ -194,39 +311,110 @@ class HttpURL(AbstractURL):
             if body:
                 return body, False
 
-        s = self._connect()
-        request = self._build_request()
-        s.send(request.encode("utf8"))
+        content = "".join(self.stream())
+        return content, self.should_view_source
 
-        # Write response bytes to a file-like object, handling HTTP line endings
-        response = s.makefile("rb", newline="\r\n")
+    async def _read_chunks_async(self, reader: asyncio.StreamReader) -> bytes:
+        chunks = []
+        while True:
+            chunk_size = int(await reader.readline(), 16)
+            if chunk_size == 0:
+                break
+            chunks.append(await reader.readexactly(chunk_size))
+            await reader.readexactly(2)
+        return b"".join(chunks)
 
-        # Read out response parts; status line is first line
-        statusline = response.readline().decode("utf-8")
-        version, status, explanation = statusline.split(" ", 2)
-        response_headers = self._parse_response_headers(response)
+    async def _fetch_async(self) -> tuple[str, dict[str, str], bytes]:
+        if self.scheme == "https":
+            reader, writer = await asyncio.open_connection(
+                self.host,
+                self.port,
+                ssl=ssl.create_default_context(),
+                server_hostname=self.host,
+            )
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+
+        # Each async request gets its own connection, closed once the body is read
+        try:
+            writer.write(self._build_request(connection="close").encode("utf8"))
+            await writer.drain()
+
+            statusline = (await reader.readline()).decode("utf-8")
+            version, status, explanation = statusline.split(" ", 2)
+            response_headers = {}
+            while True:
+                line = (await reader.readline()).decode("utf-8")
+                if line == "\r\n":
+                    break
+                self._parse_header_line(line, response_headers)
+
+            if status in ["204", "304"] or status.startswith("1"):
+                content = b""
+            elif response_headers.get("transfer-encoding") == "chunked":
+                content = await self._read_chunks_async(reader)
+            elif "content-length" in response_headers:
+                length = int(response_headers["content-length"])
+                content = await reader.readexactly(length)
+            else:
+                content = await reader.read()
+        finally:
+            writer.close()
 
-        # Handle 3xx redirects
-        if status.startswith("3") and "location" in response_headers:
-            content = self._handle_redirect(response_headers.get("location"))
-            if content:
-                return content
+        return status, response_headers, content
 
-        # Handle decompression and chunking
-        if response_headers.get("content-encoding") == "gzip":
-            if response_headers.get("transfer-encoding") == "chunked":
-                content_bytes = self._read_chunks(response)
-                content = gzip.decompress(content_bytes).decode("utf-8")
-            else:
-                content = gzip.decompress(response.read()).decode("utf-8")
-        else:
-            content = response.read().decode("utf-8")
+    async def request_async(self) -> tuple[str, bool]:
+        if browser_cache.has(self.url):
+            body = browser_cache.get(self.url)
+            if body:
+                return body, False
 
-        # Handle caching results for GET 200 requests
-        if status == "200":
-            cache_control = response_headers.get("cache-control")
-            self._cache_response(cache_control, content)
+        status, response_headers, content_bytes = await self._fetch_async()
 
-        s.close()
+        location = response_headers.get("location")
+        if status.startswith("3") and location is not None:
+            self._redirect_to(location)
+            return await self.request_async()
 
+        content = self._decode_response(status, response_headers, content_bytes)
         return content, self.should_view_source
+
+
+def _request_or_none(url: AbstractURL) -> str | None:
+    try:
+        body, _ = url.request()
+    except Exception:
+        return None
+    return body
+
+
+# Results are returned in the same order as `urls`, with None for failed requests
+def request_all(
+    urls: list[AbstractURL], max_workers: int = MAX_PARALLEL_REQUESTS
+) -> list[str | None]:
+    if max_workers <= 1 or len(urls) <= 1:
+        return [_request_or_none(url) for url in urls]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        return list(executor.map(_request_or_none, urls))
+
+
+async def _request_async_or_none(
+    url: AbstractURL, semaphore: asyncio.Semaphore
+) -> str | None:
+    async with semaphore:
+        try:
+            body, _ = await url.request_async()
+        except Exception:
+            return None
+    return body
+
+
+# Async counterpart to `request_all`, keeping up to `max_in_flight` requests open
+async def request_all_async(
+    urls: list[AbstractURL], max_in_flight: int = MAX_ASYNC_REQUESTS
+) -> list[str | None]:
+    semaphore = asyncio.Semaphore(max_in_flight)
+    return await asyncio.gather(
+        *[_request_async_or_none(url, semaphore) for url in urls]
+    )
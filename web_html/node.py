@@ -1,30 +1,184 @@
-from typing import Never, Self
+from typing import ClassVar, Self
 
+from css.computed import ComputedStyle
 
 Attributes = dict[str, str]
+Style = ComputedStyle
 
+# Until styling assigns each node its own style, every node shares this empty one
+EMPTY_STYLE: Style = ComputedStyle({})
 
+
+# New nodes start out dirty, since they have never been styled. Styling clears
+# `style_dirty` once a node has its style, and `child_dirty` once every node below it
+# has been styled too.
 class Element:
+    __slots__ = (
+        "tag",
+        "attributes",
+        "classes",
+        "children",
+        "parent",
+        "style",
+        "style_dirty",
+        "child_dirty",
+        "version",
+        # Lets caches refer to nodes without keeping their tree alive
+        "__weakref__",
+    )
+
     def __init__(self, tag: str, attributes: Attributes, parent: Self | None):
         self.tag: str = tag
         self.attributes: Attributes = attributes
+        # Split once up front, since class selectors test against it for every rule
+        self.classes: tuple[str, ...] = split_classes(attributes)
         self.children: list[Node] = []
         self.parent: Element | None = parent
-        self.style: dict[str, str] = {}
+        self.style: Style = EMPTY_STYLE
+        self.style_dirty = True
+        self.child_dirty = True
+        # Bumped whenever this node or anything below it changes, for layout caching
+        self.version = 0
 
     def __repr__(self) -> str:
         return f"<{self.tag}>"
 
+    def set_attribute(self, key: str, value: str):
+        self.attributes[key] = value
+        self._attribute_changed(key)
+
+    def remove_attribute(self, key: str):
+        if key in self.attributes:
+            del self.attributes[key]
+            self._attribute_changed(key)
+
+    def _attribute_changed(self, key: str):
+        if key == "class" or key == "id":
+            self.classes = split_classes(self.attributes)
+            # Descendant selectors may have matched against this node too
+            mark_subtree_dirty(self)
+        else:
+            mark_style_dirty(self)
+
+    def insert_child(self, index: int, child: "Node"):
+        child.parent = self
+        self.children.insert(index, child)
+        mark_subtree_dirty(child)
+
+    def append_child(self, child: "Node"):
+        self.insert_child(len(self.children), child)
+
+    def remove_child(self, child: "Node"):
+        self.children.remove(child)
+        # Later changes to the detached child must not reach this tree
+        child.parent = None
+        mark_layout_dirty(self)
+
+
+# A line of preformatted text: its words, how many extra spaces come before each of
+# them, and how many spaces are left over at the end
+PreLine = tuple[tuple[str, ...], tuple[int, ...], int]
+
 
 class Text:
+    __slots__ = (
+        "text",
+        "parent",
+        "style",
+        "style_dirty",
+        "child_dirty",
+        "version",
+        "_words",
+        "_pre_lines",
+        "__weakref__",
+    )
+
+    # Text nodes never have children, so they all share one empty tuple
+    children: ClassVar[tuple[()]] = ()
+
     def __init__(self, text: str, parent: Element):
         self.text: str = text
-        self.children: list[Never] = []
-        self.parent: Element = parent
-        self.style: dict[str, str] = {}
+        self.parent: Element | None = parent
+        self.style: Style = EMPTY_STYLE
+        self.style_dirty = True
+        self.child_dirty = False
+        self.version = 0
+        # Split into words on first layout, and kept for every layout after that
+        self._words: tuple[str, ...] | None = None
+        self._pre_lines: tuple[PreLine | None, ...] | None = None
 
     def __repr__(self) -> str:
         return repr(self.text)
 
+    def set_text(self, text: str):
+        self.text = text
+        self._words = None
+        self._pre_lines = None
+        mark_layout_dirty(self)
+
+    def words(self) -> tuple[str, ...]:
+        if self._words is None:
+            self._words = tuple(self.text.split())
+        return self._words
+
+    # Inside <pre> whitespace is kept, so lines are split on single spaces instead.
+    # Empty lines are None.
+    def pre_lines(self) -> tuple[PreLine | None, ...]:
+        if self._pre_lines is None:
+            self._pre_lines = tuple(
+                split_pre_line(line) if line else None
+                for line in self.text.split("\n")
+            )
+        return self._pre_lines
+
 
 Node = Element | Text
+
+
+def split_classes(attributes: Attributes) -> tuple[str, ...]:
+    if "class" not in attributes:
+        return ()
+    # Repeated names would otherwise match the same class rules more than once
+    return tuple(dict.fromkeys(attributes["class"].split()))
+
+
+def split_pre_line(line: str) -> PreLine:
+    words: list[str] = []
+    gaps: list[int] = []
+    gap = 0
+    for word in line.split(" "):
+        if word:
+            words.append(word)
+            gaps.append(gap)
+            gap = 0
+        else:
+            gap += 1
+    return tuple(words), tuple(gaps), gap
+
+
+def mark_layout_dirty(node: Node | None):
+    while node:
+        node.version += 1
+        node = node.parent
+
+
+def mark_style_dirty(node: Node):
+    node.style_dirty = True
+    mark_layout_dirty(node)
+
+    # Flag the path from the root, so restyling can skip every other subtree
+    parent = node.parent
+    while parent and not parent.child_dirty:
+        parent.child_dirty = True
+        parent = parent.parent
+
+
+def mark_subtree_dirty(node: Node):
+    stack = [node]
+    while stack:
+        descendant = stack.pop()
+        descendant.style_dirty = True
+        descendant.child_dirty = bool(descendant.children)
+        descendant.version += 1
+        stack.extend(descendant.children)
+    mark_style_dirty(node)
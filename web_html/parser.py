@@ -1,33 +1,76 @@
-from typing import Never, Self
+import re
+import sys
+from typing import Literal, Never, Self
 
 from constants import HEAD_TAGS, SELF_CLOSING_TAGS
 from web_html.node import Attributes, Element, Text
 
+# Where we are in the document, which decides which tags get implicitly inserted
+InsertionMode = Literal["initial", "before-head", "in-head", "in-body"]
+
+# A name, optionally followed by a double quoted, single quoted or unquoted value
+ATTRIBUTE = re.compile(r"""([^\s=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|(\S*)))?""")
+
+HEAD_TAG_SET = frozenset(HEAD_TAGS)
+SELF_CLOSING_TAG_SET = frozenset(SELF_CLOSING_TAGS)
+
 
 class HTMLParser:
-    def __init__(self, body: str):
+    def __init__(self, body: str = ""):
         self.body: str = body
         self.unfinished: list[Element] = []
+        self.mode: InsertionMode = "initial"
+        # Root of the tree, available while the document is still being fed in
+        self.root: Element | None = None
+
+        # Partial text or tag contents carried over between chunks
+        self.pending: list[str] = []
+        self.in_tag = False
 
     def parse(self):
-        text = ""
-        in_tag = False
+        self.feed(self.body)
+        return self.close()
+
+    # Every "<" ends a run of text and every ">" ends a tag, so rather than looking at
+    # each character we jump from one delimiter to the next and slice out the text in
+    # between. Both next positions are remembered, so each find scans a span once
+    def feed(self, chunk: str):
+        start = 0
+        next_open = chunk.find("<")
+        next_close = chunk.find(">")
+
+        while next_open != -1 or next_close != -1:
+            if next_close == -1 or (next_open != -1 and next_open < next_close):
+                end = next_open
+                next_open = chunk.find("<", end + 1)
+            else:
+                end = next_close
+                next_close = chunk.find(">", end + 1)
 
-        for c in self.body:
-            if c == "<":
-                in_tag = True
+            text = chunk[start:end]
+            if self.pending:
+                self.pending.append(text)
+                text = "".join(self.pending)
+                self.pending = []
+
+            if chunk[end] == "<":
+                self.in_tag = True
                 if text:
                     self.add_text(text)
-                text = ""
-            elif c == ">":
-                in_tag = False
-                self.add_tag(text)
-                text = ""
             else:
-                text += c
+                self.in_tag = False
+                self.add_tag(text)
+            start = end + 1
+
+        # Trailing text is held back, since the next chunk may continue it
+        if start < len(chunk):
+            self.pending.append(chunk[start:])
 
-        if not in_tag and text:
+    def close(self):
+        text = "".join(self.pending)
+        if not self.in_tag and text:
             self.add_text(text)
+        self.pending = []
 
         return self.finish()
 
@@ -39,20 +82,26 @@ class HTMLParser:
 
         self.implicit_tags(tag)
 
+        # Nodes are attached to their parent as soon as they open, so the partial
+        # tree is always connected
         if tag.startswith("/"):
             if len(self.unfinished) == 1:
                 return
-            node = self.unfinished.pop()
-            parent = self.unfinished[-1]
-            parent.children.append(node)
-        elif tag in SELF_CLOSING_TAGS:
+            self.unfinished.pop()
+            self.update_mode()
+        elif tag in SELF_CLOSING_TAG_SET:
             parent = self.unfinished[-1]
             node = Element(tag, attributes, parent)
             parent.children.append(node)
         else:
             parent = self.unfinished[-1] if self.unfinished else None
             node = Element(tag, attributes, parent)
+            if parent:
+                parent.children.append(node)
+            else:
+                self.root = node
             self.unfinished.append(node)
+            self.update_mode()
 
     def add_text(self, text: str):
         if text.isspace():
@@ -64,30 +113,44 @@ class HTMLParser:
         parent.children.append(node)
 
     def get_attributes(self, text) -> tuple[str, Attributes]:
-        parts = text.split()
-        tag = parts[0].casefold()
+        parts = text.split(None, 1)
+        # Tag and attribute names repeat constantly, so nodes share one copy of each
+        tag = sys.intern(parts[0].casefold())
         attributes = {}
-        for attrpair in parts[1:]:
-            if "=" in attrpair:
-                key, value = attrpair.split("=", 1)
-                if len(value) > 2 and value[0] in ["'", '"']:
-                    value = value[1:-1]
-                attributes[key.casefold()] = value
-            else:
-                attributes[attrpair.casefold()] = ""
+        if len(parts) > 1:
+            # Quoted values may contain spaces, like class="a b"
+            for key, double, single, bare in ATTRIBUTE.findall(parts[1]):
+                attributes[sys.intern(key.casefold())] = double or single or bare
         return tag, attributes
 
+    # The root is always <html>, so the mode only depends on the first two open tags
+    def update_mode(self):
+        depth = len(self.unfinished)
+        if depth == 0:
+            self.mode = "initial"
+        elif depth == 1:
+            self.mode = "before-head"
+        elif self.unfinished[1].tag == "head":
+            self.mode = "in-head"
+        else:
+            self.mode = "in-body"
+
     def implicit_tags(self, tag: str | None):
         while True:
-            open_tags = [node.tag for node in self.unfinished]
-            if open_tags == [] and tag != "html":
+            if self.mode == "initial" and tag != "html":
                 self.add_tag("html")
-            elif open_tags == ["html"] and tag not in ["head", "body", "/html"]:
-                if tag in HEAD_TAGS:
+            elif self.mode == "before-head" and tag not in ["head", "body", "/html"]:
+                if tag in HEAD_TAG_SET:
                     self.add_tag("head")
                 else:
                     self.add_tag("body")
-            elif open_tags == ["html", "head"] and tag not in ["/head"] + HEAD_TAGS:
+            # Only <head> itself is closed implicitly, not elements like <title> in it
+            elif (
+                self.mode == "in-head"
+                and len(self.unfinished) == 2
+                and tag != "/head"
+                and tag not in HEAD_TAG_SET
+            ):
                 self.add_tag("/head")
             else:
                 break
@@ -96,9 +159,6 @@ class HTMLParser:
         if not self.unfinished:
             self.implicit_tags(None)
 
-        while len(self.unfinished) > 1:
-            node = self.unfinished.pop()
-            parent = self.unfinished[-1]
-            parent.children.append(node)
-
-        return self.unfinished.pop()
+        self.unfinished.clear()
+        self.update_mode()
+        return self.root